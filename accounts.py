@@ -0,0 +1,150 @@
+"""
+Managing tokens of users.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ujson
+
+import api
+import config
+from cache import SingleFlight
+
+REFRESHES = SingleFlight()
+REFRESH = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refresh")
+
+
+def _get_fernet():
+    """
+    Get cipher for credentials, cryptography is needed only if they are stored.
+    """
+    from cryptography.fernet import Fernet
+
+    return Fernet(config.CREDENTIALS_KEY)
+
+
+def create_user(token, username, password):
+    """
+    Create data of user with new token, saving credentials, if it's allowed.
+    """
+    user = {"token": token, "token_time": time.time()}
+    if config.STORE_CREDENTIALS:
+        user["credentials"] = (
+            _get_fernet()
+            .encrypt(ujson.dumps([username, password]).encode("utf-8"))
+            .decode("utf-8")
+        )
+    return user
+
+
+def get_account(users, key):
+    """
+    Get key of account, which diary is used in chat.
+    Chats, linked by /set, keep only key of owner's account.
+    None if there is no such account.
+    """
+    chat = users.get(key)
+    if chat is None:
+        return None
+    if "owner" not in chat:
+        return key
+    if chat["owner"] not in users:
+        return None
+    return chat["owner"]
+
+
+def link_chats(users):
+    """
+    Replace copies of accounts, saved by /set to group chats, with links to them.
+    Copies, which token doesn't match any account anymore, are kept.
+    """
+    owners = {}
+    for key in users:
+        if int(key) > 0 and "token" in users[key]:
+            owners[users[key]["token"]] = key
+    for key in list(users):
+        chat = users[key]
+        if int(key) < 0 and chat.get("token") in owners:
+            link = {"owner": owners[chat["token"]]}
+            if "notify" in chat:
+                link["notify"] = chat["notify"]
+            users[key] = link
+
+
+def _reauth(users, key):
+    """
+    Get new token by stored credentials.
+    """
+    user = users[key]
+    username, password = ujson.loads(
+        _get_fernet().decrypt(user["credentials"].encode("utf-8"))
+    )
+    logging.debug("Getting new token for user")
+    user["token"] = api.auth(username, password)
+    user["token_time"] = time.time()
+    user.pop("expired", None)
+    users[key] = user
+    return user["token"]
+
+
+def refresh(users, key):
+    """
+    Get new token, only once, if it's requested from several threads.
+    """
+    return REFRESHES.do(key, _reauth, users, key)
+
+
+def _refresh_in_background(users, key):
+    """
+    Refreshing token, logging errors, as nobody waits for result.
+    """
+    try:
+        if time.time() - users[key]["token_time"] > config.TOKEN_MAX_AGE:
+            refresh(users, key)
+    except Exception as error:
+        logging.error("Error on refreshing token: %s", str(error))
+
+
+def call(users, key, request, *args, **kwargs):
+    """
+    Call request with token of user as first argument.
+    Expired token is replaced by new one, if credentials are stored,
+    otherwise schools.by isn't requested until user logs in again.
+    """
+    user = users[key]
+    if "credentials" not in user:
+        if user.get("expired"):
+            raise api.TokenExpired("Token expired")
+    elif time.time() - user.get("token_time", time.time()) > config.TOKEN_MAX_AGE:
+        REFRESH.submit(_refresh_in_background, users, key)
+    try:
+        return request(user["token"], *args, **kwargs)
+    except api.TokenExpired:
+        if "credentials" not in user:
+            user["expired"] = True
+            users[key] = user
+            raise
+    logging.debug("Token expired, trying to get new one")
+    try:
+        token = refresh(users, key)
+    except KeyError as error:
+        user["expired"] = True
+        user.pop("credentials")
+        users[key] = user
+        raise api.TokenExpired("Credentials are not valid") from error
+    return request(token, *args, **kwargs)
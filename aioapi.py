@@ -0,0 +1,184 @@
+"""
+Working with schools.by API asynchronously.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+
+import aiohttp
+
+from api import (
+    ATTEMPTS,
+    BASE_URL,
+    CLIENT_ID,
+    TokenExpired,
+    Unavailable,
+    get_breaker,
+    get_delay,
+    get_urls,
+)
+from models import parse_day, parse_lastpage, parse_week
+
+
+class Client:
+    """
+    Client for schools.by API, sharing one connection pool between all requests.
+    Not more than limit requests are sent at the same time.
+    """
+
+    def __init__(self, limit=100, timeout=3, base_url=BASE_URL):
+        self._urls = get_urls(base_url)
+        self._limit = limit
+        self._timeout = timeout
+        self._semaphore = None
+        self._session = None
+
+    def _get_session(self):
+        """
+        Creating session inside of running event loop.
+        Session is shared by all users, so cookies are not kept.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._limit)
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._limit, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Closing all connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _send(self, method, url, **kwargs):
+        """
+        Sending request with limited number of attempts.
+        Returns status and decoded JSON.
+        """
+        session = self._get_session()
+        breaker = get_breaker(url)
+        async with self._semaphore:
+            for attempt in range(ATTEMPTS):
+                if not breaker.allow():
+                    raise Unavailable("API is unavailable")
+                try:
+                    async with session.request(method, url, **kwargs) as response:
+                        result = response.status, await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+                    logging.error("Error on request: %s", str(error))
+                    breaker.failure()
+                else:
+                    if result[0] < 500:
+                        breaker.success()
+                        return result
+                    logging.error("Server error: %s", str(result[0]))
+                    breaker.failure()
+                if attempt + 1 < ATTEMPTS:
+                    await asyncio.sleep(get_delay(attempt))
+        raise SystemError("Can't access API")
+
+    async def auth(self, username, password):
+        """
+        Authinticating and getting token.
+        """
+        status, response = await self._send(
+            "POST",
+            self._urls["auth"],
+            data={"username": username, "password": password},
+            headers={"client-id": CLIENT_ID},
+        )
+        if (
+            status == 400
+            and response["details"]
+            == "Невозможно войти с предоставленными учетными данными."
+        ):
+            raise KeyError
+        if status != 200:
+            logging.error(str(response))
+            raise SystemError("Can't access API")
+        return response["token"]
+
+    async def _get_request(self, token, request):
+        """
+        Forming and sending request.
+        """
+        status, response = await self._send(
+            "GET", request, headers={"Authorization": "Token " + token + " "}
+        )
+        if status == 401:
+            raise TokenExpired("Token expired")
+        if status != 200:
+            logging.error(str(response))
+            raise SystemError("Can't access API")
+        return response
+
+    async def get_info(self, token):
+        """
+        Get user info from schools.by
+        """
+        return await self._get_request(token, self._urls["info"])
+
+    async def get_pupils(self, token, parent_id):
+        """
+        Get all pupil_ids by parent_id
+        """
+        return await self._get_request(
+            token, self._urls["pupils"].format(parent_id=parent_id)
+        )
+
+    async def get_hometask(self, token, date, pupil_id):
+        """
+        Get hometask by date for pupil, None if it isn't working day.
+        """
+        date = date.isoformat()
+        return parse_day(
+            date,
+            await self._get_request(
+                token, self._urls["day"].format(pupil_id=pupil_id, date=date)
+            ),
+        )
+
+    async def get_week(self, token, date, pupil_id):
+        """
+        Get hometask on week.
+        """
+        return parse_week(
+            await self._get_request(
+                token,
+                self._urls["week"].format(pupil_id=pupil_id, date=date.isoformat()),
+            )
+        )
+
+    async def get_lastpage(self, token, pupil_id):
+        """
+        Get last daybook page.
+        """
+        return parse_lastpage(
+            await self._get_request(
+                token, self._urls["lastpage"].format(pupil_id=pupil_id)
+            )
+        )
@@ -15,33 +15,212 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import http.cookiejar
 import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
 
+import requests
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
-RETRIES = Retry(total=5, backoff_factor=0.1)
+import metrics
+from models import parse_day, parse_lastpage, parse_week
 
+POOL_SIZE = 10
+BASE_URL = "https://schools.by/v2/"
+CLIENT_ID = "0a6d97ffe21e6a9a9d9b7317456af1a92a6d6dbb59a02b24db2ad6add1381849"
+ATTEMPTS = 3
+BACKOFF = 0.2
+FAILURES = 5
+RECOVERY_TIME = 30
 
-def auth(username, password, session):
+# Paths of requests, relative to base URL, with fields to fill in.
+ENDPOINTS = {
+    "auth": "api/auth",
+    "info": "subdomain-api/user/current",
+    "pupils": "subdomain-api/parent/{parent_id}/pupils",
+    "day": "subdomain-api/pupil/{pupil_id}/daybook/day/{date}",
+    "week": "subdomain-api/pupil/{pupil_id}/daybook/week/{date}",
+    "lastpage": "subdomain-api/pupil/{pupil_id}/daybook/last-page",
+}
+
+
+class Unavailable(SystemError):
     """
-    Authinticating and getting token.
+    Raised without sending request, when host is considered unhealthy.
+    """
+
+
+class TokenExpired(SystemError):
+    """
+    Raised, when schools.by doesn't accept token anymore.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to host after several failures in a row.
+    After recovery time one request is let through to check, if host is back.
+    Probe, which didn't report its result in recovery time, isn't waited for.
+    """
+
+    def __init__(self, failures=FAILURES, recovery_time=RECOVERY_TIME):
+        self.failures = failures
+        self.recovery_time = recovery_time
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._opened = None
+        self._probe = None
+
+    def allow(self):
+        """
+        Check, if request can be sent.
+        """
+        with self._lock:
+            if self._opened is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened < self.recovery_time:
+                return False
+            if self._probe is not None and now - self._probe < self.recovery_time:
+                return False
+            self._probe = now
+            return True
+
+    def success(self):
+        """
+        Host answered, closing breaker.
+        """
+        with self._lock:
+            self._failed = 0
+            self._opened = None
+            self._probe = None
+
+    def failure(self):
+        """
+        Host didn't answer, opening breaker after too many failures.
+        """
+        with self._lock:
+            self._failed += 1
+            self._probe = None
+            if self._failed >= self.failures:
+                if self._opened is None:
+                    logging.error("Too many failures, stopping requests for a while")
+                self._opened = time.monotonic()
+
+
+BREAKERS = {}
+BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(url):
+    """
+    Get circuit breaker for host of url.
+    """
+    host = urlsplit(url).hostname
+    with BREAKERS_LOCK:
+        if host not in BREAKERS:
+            BREAKERS[host] = CircuitBreaker()
+        return BREAKERS[host]
+
+
+def get_delay(attempt):
+    """
+    Random delay before next attempt, growing exponentially.
+    """
+    return random.uniform(0, BACKOFF * 2**attempt)
+
+
+def create_session(pool_size=POOL_SIZE):
+    """
+    Creating session with keep-alive connection pool to schools.by.
+    Session is shared by all users, so cookies are not kept between requests.
+    Requests aren't retried by adapter, attempts are made only by _send.
+    """
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=0,
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = create_session()
+
+
+def configure_session(pool_size):
     """
-    session.mount("https://", HTTPAdapter(max_retries=RETRIES))
-    retry = True
-    while retry:
+    Replacing shared session with one, that has pool of given size.
+    """
+    global SESSION
+    old_session = SESSION
+    SESSION = create_session(pool_size)
+    old_session.close()
+
+
+def get_urls(base_url):
+    """
+    Templates of URLs for all endpoints of API at base_url.
+    """
+    return {name: base_url + path for name, path in ENDPOINTS.items()}
+
+
+URLS = get_urls(BASE_URL)
+
+
+def configure_base_url(base_url):
+    """
+    Sending requests to API at base_url, like mirror or caching proxy.
+    """
+    global URLS
+    URLS = get_urls(base_url)
+
+
+def _send(session, method, url, **kwargs):
+    """
+    Sending request with limited number of attempts.
+    """
+    breaker = get_breaker(url)
+    for attempt in range(ATTEMPTS):
+        if not breaker.allow():
+            raise Unavailable("API is unavailable")
         try:
-            request = session.post(
-                "https://schools.by/v2/api/auth",
-                data={"username": username, "password": password},
-                headers={
-                    "client-id": "0a6d97ffe21e6a9a9d9b7317456af1a92a6d6dbb59a02b24db2ad6add1381849"
-                },
-                timeout=3,
-            )
-            retry = False
+            request = session.request(method, url, timeout=3, **kwargs)
         except Exception as error:
-            logging.error("Error on auth: %s", (str(error)))
+            logging.error("Error on request: %s", str(error))
+            breaker.failure()
+        else:
+            if request.status_code < 500:
+                breaker.success()
+                return request
+            logging.error("Server error: %s", str(request.status_code))
+            breaker.failure()
+        if attempt + 1 < ATTEMPTS:
+            time.sleep(get_delay(attempt))
+    raise SystemError("Can't access API")
+
+
+@metrics.endpoint
+def auth(username, password, session=None):
+    """
+    Authinticating and getting token.
+    """
+    if session is None:
+        session = SESSION
+    request = _send(
+        session,
+        "POST",
+        URLS["auth"],
+        data={"username": username, "password": password},
+        headers={"client-id": CLIENT_ID},
+    )
     if (
         request.status_code == 400
         and request.json()["details"]
@@ -55,90 +234,70 @@ def auth(username, password, session):
     return token
 
 
-def _get_request(token, request, session):
+def _get_request(token, request, session=None):
     """
     Forming and sending request.
     """
-    session.mount("https://", HTTPAdapter(max_retries=RETRIES))
-    headers = {"Authorization": "Token " + token + " "}
-    retry = True
-    while retry:
-        try:
-            request = session.get(
-                request,
-                headers=headers,
-                timeout=3,
-            )
-            retry = False
-        except Exception as error:
-            logging.error("Error on request: %s", str(error))
+    if session is None:
+        session = SESSION
+    request = _send(
+        session, "GET", request, headers={"Authorization": "Token " + token + " "}
+    )
+    if request.status_code == 401:
+        raise TokenExpired("Token expired")
     if request.status_code != 200:
         logging.error(str(request.text))
         raise SystemError("Can't access API")
     return request.json()
 
 
-def get_info(token, session):
+@metrics.endpoint
+def get_info(token, session=None):
     """
     Get user info from schools.by
     """
-    return _get_request(
-        token, "https://schools.by/v2/subdomain-api/user/current", session
-    )
+    return _get_request(token, URLS["info"], session)
 
 
-def get_pupils(token, parent_id, session):
+@metrics.endpoint
+def get_pupils(token, parent_id, session=None):
     """
     Get all pupil_ids by parent_id
     """
-    return _get_request(
-        token,
-        "https://schools.by/v2/subdomain-api/parent/" + str(parent_id) + "/pupils",
-        session,
-    )
+    return _get_request(token, URLS["pupils"].format(parent_id=parent_id), session)
 
 
-def get_hometask(token, date, pupil_id, session):
+@metrics.endpoint
+def get_hometask(token, date, pupil_id, session=None):
     """
-    Get hometask by date for pupil
+    Get hometask by date for pupil, None if it isn't working day.
     """
-    year, month, day = (
-        "20" + date.split(".")[2],
-        date.split(".")[1],
-        date.split(".")[0],
-    )
-    return _get_request(
-        token,
-        "https://schools.by/v2/subdomain-api/pupil/"
-        + str(pupil_id)
-        + "/daybook/day/"
-        + str(year + "-" + month + "-" + day),
-        session,
+    date = date.isoformat()
+    return parse_day(
+        date,
+        _get_request(token, URLS["day"].format(pupil_id=pupil_id, date=date), session),
     )
 
 
-def get_week(token, date, pupil_id, session):
+@metrics.endpoint
+def get_week(token, date, pupil_id, session=None):
     """
     Get hometask on week.
     """
-    return _get_request(
-        token,
-        "https://schools.by/v2/subdomain-api/pupil/"
-        + str(pupil_id)
-        + "/daybook/week/"
-        + date.strftime("%Y-%m-%d"),
-        session,
+    return parse_week(
+        _get_request(
+            token,
+            URLS["week"].format(pupil_id=pupil_id, date=date.isoformat()),
+            session,
+        )
     )
 
 
-def get_lastpage(token, pupil_id, session):
+@metrics.endpoint
+def get_lastpage(token, pupil_id, session=None):
     """
     Get last daybook page.
     """
-    return _get_request(
-        token,
-        "https://schools.by/v2/subdomain-api/pupil/"
-        + str(pupil_id)
-        + "/daybook/last-page",
-        session,
+    return parse_lastpage(
+        _get_request(token, URLS["lastpage"].format(pupil_id=pupil_id), session)
     )
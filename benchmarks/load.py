@@ -0,0 +1,406 @@
+"""
+Load test of bot with local stand-ins for schools.by and Telegram.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Run from the directory with config.py:
+
+    python3 benchmarks/load.py --rate 50 --duration 30 --latency 0.1 --errors 0.01
+
+Nothing is sent to real schools.by or Telegram, database is temporary.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.getcwd())
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Weeks before and after current one, which are in the same quarter.
+QUARTER_WEEKS = 4
+SUBJECTS = ("Math", "Physics", "History", "Biology", "English", "Art", "Music")
+
+# Part of updates of every kind.
+KINDS = {
+    "hometask": 0.3,
+    "day": 0.4,
+    "week": 0.1,
+    "marks": 0.1,
+    "lastpage": 0.1,
+}
+
+
+def create_day(date, pupil_id):
+    """
+    Day of daybook in format of schools.by.
+    """
+    return {
+        "date": date.isoformat(),
+        "lessons": {
+            str(number): {
+                "subject": SUBJECTS[(number + date.day) % len(SUBJECTS)],
+                "mark": str((pupil_id + number + date.day) % 10 + 1),
+                "lesson_data": {
+                    "hometask": {
+                        "text": "Exercise " + str(number) + " on page " + str(date.day),
+                        "attachments": [],
+                    },
+                    "theme": {"text": "Theme " + str(number)},
+                },
+            }
+            for number in range(1, 8)
+        },
+    }
+
+
+def create_week(date, pupil_id):
+    """
+    Week of daybook in format of schools.by, holidays outside of quarter.
+    """
+    today = datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+    if abs((date - monday).days) > QUARTER_WEEKS * 7:
+        return {"holidays": True}
+    return {
+        (date + datetime.timedelta(days=day)).isoformat(): create_day(
+            date + datetime.timedelta(days=day), pupil_id
+        )
+        for day in range(5)
+    }
+
+
+def create_lastpage(pupil_id):
+    """
+    Last page of daybook in format of schools.by.
+    """
+    return {
+        "rows": [
+            {
+                "class_subject": {"subject": subject},
+                "quarter_marks": {
+                    "1": {"m": str((pupil_id + number) % 10 + 1)},
+                    "2": None,
+                    "3": None,
+                    "4": None,
+                },
+                "year_mark": None,
+            }
+            for number, subject in enumerate(SUBJECTS)
+        ]
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Base of fake servers, answering with JSON.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _answer(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length)
+
+    def log_message(self, *args):
+        pass
+
+
+class SchoolsHandler(Handler):
+    """
+    Fake schools.by, slowed down and failing as configured on server.
+    """
+
+    def _process(self):
+        self._read()
+        time.sleep(self.server.latency)
+        if random.random() < self.server.errors:
+            self._answer(500, {"details": "Injected error"})
+            return
+        parts = self.path.strip("/").split("/")
+        if parts[-2:] == ["api", "auth"]:
+            self._answer(200, {"token": "token"})
+        elif "daybook" in parts:
+            pupil_id = int(parts[parts.index("pupil") + 1])
+            if parts[-1] == "last-page":
+                self._answer(200, create_lastpage(pupil_id))
+                return
+            date = datetime.date.fromisoformat(parts[-1])
+            if parts[-2] == "week":
+                self._answer(200, create_week(date, pupil_id))
+            else:
+                self._answer(200, create_day(date, pupil_id))
+        else:
+            self._answer(404, {"details": "Not found"})
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self._process()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self._process()
+
+
+class TelegramHandler(Handler):
+    """
+    Fake Telegram Bot API, accepting every request.
+    """
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        url = urlsplit(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        params = parse_qs(url.query)
+        params.update(parse_qs(self._read().decode("utf-8")))
+        result = True
+        if method in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", [1])[0]), "type": "private"},
+                "text": "",
+            }
+        self._answer(200, {"ok": True, "result": result})
+
+    do_GET = do_POST
+
+
+def start_server(handler, **settings):
+    """
+    Run server on free local port in background.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    for name, value in settings.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def create_message(user_id, number, text):
+    """
+    Message from user in private chat.
+    """
+    message = {
+        "message_id": number,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(text)}
+        ]
+    return message
+
+
+def create_update(kind, user_id, number, keyboards):
+    """
+    Update of given kind from user.
+    """
+    today = datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+    if kind in ("hometask", "marks", "lastpage"):
+        return {
+            "update_id": number,
+            "message": create_message(user_id, number, "/" + kind),
+        }
+    if kind == "day":
+        data = keyboards.pack_date(
+            keyboards.DAY, monday + datetime.timedelta(days=random.randrange(5))
+        )
+    else:
+        data = keyboards.pack_date(
+            keyboards.WEEK,
+            monday + datetime.timedelta(weeks=random.randint(-QUARTER_WEEKS, 1)),
+        )
+    return {
+        "update_id": number,
+        "callback_query": {
+            "id": str(number),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "data": data,
+            "message": {
+                "message_id": number,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "",
+                "reply_to_message": create_message(user_id, number, "/hometask"),
+            },
+        },
+    }
+
+
+def get_percentile(values, part):
+    """
+    Value, which is greater than part of sorted values.
+    """
+    return values[min(len(values) - 1, int(part * len(values)))]
+
+
+def run(args):
+    """
+    Send updates to bot and print latency of every kind.
+    """
+    logging.basicConfig(level=logging.CRITICAL)
+
+    import config  # pylint: disable=import-outside-toplevel
+
+    directory = tempfile.mkdtemp()
+    config.DATABASE = os.path.join(directory, "load.sqlite3")
+    config.STATE_DATABASE = os.path.join(directory, "state.sqlite3")
+
+    schools = start_server(SchoolsHandler, latency=args.latency, errors=args.errors)
+    telegram = start_server(TelegramHandler)
+
+    # pylint: disable=import-outside-toplevel
+    import api
+    import keyboards
+    import main
+    from dispatcher import UpdateQueue
+    from telebot import apihelper
+
+    api.configure_base_url("http://127.0.0.1:%d/v2/" % schools.server_port)
+    apihelper.API_URL = "http://127.0.0.1:%d/bot{0}/{1}" % telegram.server_port
+
+    users = [100000 + number for number in range(args.users)]
+    for user_id in users:
+        main.TOKENS[str(user_id)] = {
+            "token": "token",
+            "token_time": time.time(),
+            "user_info": {
+                "type": "Pupil",
+                "id": user_id,
+                "subdomain": "school" + str(user_id % args.schools),
+            },
+        }
+
+    sent = {}
+    done = {}
+    lock = threading.Lock()
+
+    def process(updates):
+        try:
+            main.BOT.process_new_updates(updates)
+        finally:
+            with lock:
+                for update in updates:
+                    done[update.update_id] = time.perf_counter()
+
+    main.UPDATES = UpdateQueue(process, config.WORKERS, config.QUEUE_SIZE)
+    client = main.app.test_client()
+
+    kinds = list(KINDS.keys())
+    weights = list(KINDS.values())
+    total = int(args.rate * args.duration)
+    rejected = 0
+    start = time.perf_counter()
+    for number in range(1, total + 1):
+        delay = start + number / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        kind = random.choices(kinds, weights)[0]
+        update = create_update(kind, random.choice(users), number, keyboards)
+        sent[number] = (kind, time.perf_counter())
+        response = client.post(
+            main.WEBHOOK_URL_PATH,
+            data=json.dumps(update),
+            content_type="application/json",
+        )
+        if response.status_code != 200:
+            rejected += 1
+            del sent[number]
+
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        with lock:
+            if len(done) >= len(sent):
+                break
+        time.sleep(0.1)
+    finish = time.perf_counter()
+
+    latencies = {kind: [] for kind in kinds}
+    with lock:
+        for number, (kind, sent_time) in sent.items():
+            if number in done:
+                latencies[kind].append(done[number] - sent_time)
+    print(
+        "Sent {} updates in {:.1f} s, rejected {}, not processed {}, errors {}".format(
+            total,
+            finish - start,
+            rejected,
+            len(sent) - len(done),
+            main.UPDATES.stats()["failed"],
+        )
+    )
+    print(
+        "{:<10} {:>8} {:>10} {:>10} {:>10}".format(
+            "kind", "count", "p50, ms", "p99, ms", "per sec"
+        )
+    )
+    for kind in kinds:
+        values = sorted(latencies[kind])
+        if not values:
+            continue
+        print(
+            "{:<10} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                kind,
+                len(values),
+                get_percentile(values, 0.5) * 1000,
+                get_percentile(values, 0.99) * 1000,
+                len(values) / (finish - start),
+            )
+        )
+
+
+def main():
+    """
+    Parse arguments and run load test.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rate", type=float, default=20, help="updates per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--schools", type=int, default=10)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="delay of schools.by, seconds"
+    )
+    parser.add_argument(
+        "--errors", type=float, default=0, help="part of failing schools.by requests"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="seconds to wait for answers"
+    )
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark of parsing schools.by responses into models.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import datetime
+import os
+import sys
+import timeit
+import tracemalloc
+
+import ujson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import parse_week  # pylint: disable=wrong-import-position
+
+WEEKS = 20
+REPEATS = 200
+
+
+def create_lesson(number):
+    """
+    Lesson in format of schools.by with fields, which aren't used by bot.
+    """
+    return {
+        "subject": "Subject " + str(number),
+        "mark": str(number % 10 + 1),
+        "lesson_id": number * 1000,
+        "teacher": {"id": number, "full_name": "Teacher " + str(number)},
+        "lesson_data": {
+            "hometask": {
+                "text": "Exercise " + str(number) + " on page " + str(number * 7),
+                "attachments": [{"file": "https://schools.by/file/" + str(number)}],
+                "created": "2021-09-01T08:00:00",
+            },
+            "theme": {"text": "Theme " + str(number), "created": "2021-09-01"},
+            "not_transferred": [],
+        },
+    }
+
+
+def create_week(start):
+    """
+    Week in format of schools.by with five days of seven lessons.
+    """
+    return {
+        (start + datetime.timedelta(days=day)).isoformat(): {
+            "date": (start + datetime.timedelta(days=day)).isoformat(),
+            "lessons": {str(number): create_lesson(number) for number in range(1, 8)},
+        }
+        for day in range(5)
+    }
+
+
+def get_memory(function):
+    """
+    Get memory in bytes, taken by result of function.
+    """
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    """
+    Print time of parsing and memory of raw and parsed weeks.
+    """
+    start = datetime.date(2021, 9, 6)
+    responses = [
+        ujson.dumps(create_week(start + datetime.timedelta(weeks=week)))
+        for week in range(WEEKS)
+    ]
+
+    raw = timeit.timeit(
+        lambda: [ujson.loads(response) for response in responses], number=REPEATS
+    )
+    parsed = timeit.timeit(
+        lambda: [parse_week(ujson.loads(response)) for response in responses],
+        number=REPEATS,
+    )
+    print(
+        "Decoding {} weeks: {:.2f} ms, with parsing: {:.2f} ms".format(
+            WEEKS, raw / REPEATS * 1000, parsed / REPEATS * 1000
+        )
+    )
+
+    raw = get_memory(lambda: [ujson.loads(response) for response in responses])
+    parsed = get_memory(
+        lambda: [parse_week(ujson.loads(response)) for response in responses]
+    )
+    print(
+        "Memory of {} weeks: raw {} KiB, parsed {} KiB".format(
+            WEEKS, raw // 1024, parsed // 1024
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
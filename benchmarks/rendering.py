@@ -0,0 +1,101 @@
+"""
+Benchmark of forming answers with home task for large days.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import render
+from models import Day, Lesson
+
+REPEATS = 1000
+
+
+def create_day(lessons, attachments):
+    """
+    Day with long home tasks and many attachments in every lesson.
+    """
+    return Day(
+        "2021-09-06",
+        tuple(
+            Lesson(
+                str(number),
+                "Subject_" + str(number),
+                "Exercises *1-10* on page " + str(number) + " " * 200,
+                "Theme `" + str(number) + "`",
+                tuple(
+                    "https://schools.by/file/" + str(number) + "/" + str(attachment)
+                    for attachment in range(attachments)
+                ),
+                None,
+            )
+            for number in range(1, lessons + 1)
+        ),
+    )
+
+
+def concatenate(day):
+    """
+    Forming answer by adding strings, as it was done before render.
+    """
+    string = ""
+    for lesson in day.lessons:
+        string += "`" + lesson.number + ". " + lesson.subject + ": "
+        if lesson.hometask is None:
+            string += "Ничего\n`"
+            continue
+        string += lesson.hometask
+        if lesson.theme is not None:
+            string += " Тема: " + lesson.theme
+        if lesson.attachments:
+            string += "`"
+            for attachment in lesson.attachments:
+                string += "\n[Файл](" + attachment + ")\n"
+        else:
+            string += "`\n"
+    return string
+
+
+def main():
+    """
+    Print time of forming answers and size of messages.
+    """
+    for lessons, attachments in ((7, 0), (7, 5), (12, 30)):
+        day = create_day(lessons, attachments)
+        old = timeit.timeit(lambda: concatenate(day), number=REPEATS)
+        new = timeit.timeit(lambda: render.split(render.hometask(day)), number=REPEATS)
+        messages = render.split(render.hometask(day))
+        assert all(len(message) <= render.LIMIT for message in messages)
+        print(
+            "{} lessons, {} attachments: concatenation {:.1f} us ({} chars), "
+            "render {:.1f} us ({} messages, longest {} chars)".format(
+                lessons,
+                attachments,
+                old / REPEATS * 1000000,
+                len(concatenate(day)),
+                new / REPEATS * 1000000,
+                len(messages),
+                max(len(message) for message in messages),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
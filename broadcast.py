@@ -0,0 +1,127 @@
+"""
+Sending messages to all chats of the bot.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+
+import telebot
+
+from limits import TokenBucket
+
+LEASE_TIME = 60
+POLL_TIME = 30
+
+
+class BroadcastQueue:
+    """
+    Broadcasts, saved in storage and sent in background with limited rate.
+    Progress is saved after every message, so broadcast continues after restart,
+    taken by any worker, when lease of the previous one expires.
+    """
+
+    def __init__(self, storage, users, bot, rate, report):
+        self._storage = storage
+        self._users = users
+        self._bot = bot
+        self._bucket = TokenBucket(rate, 1)
+        self._report = report
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._owner = None
+
+    def start(self):
+        """
+        Start sending thread once in every process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._owner = str(self._pid) + "-" + uuid.uuid4().hex
+            threading.Thread(target=self._work, name="broadcast", daemon=True).start()
+
+    def add(self, admin_chat, text):
+        """
+        Add broadcast of text to all chats.
+        """
+        self._storage.add_broadcast(admin_chat, text, list(self._users))
+        self.start()
+        self._event.set()
+
+    def _send(self, broadcast, chat):
+        """
+        Send message to one chat, removing chats, where bot was blocked.
+        """
+        self._bucket.acquire()
+        try:
+            self._bot.send_message(
+                int(chat), broadcast["text"], disable_notification=True
+            )
+            broadcast["delivered"] += 1
+        except telebot.apihelper.ApiTelegramException as error:
+            broadcast["failed"] += 1
+            logging.error("Error on broadcast to %s: %s", chat, str(error))
+            if error.error_code == 403:
+                logging.debug("Bot was blocked, removing chat")
+                self._users.pop(chat, None)
+        except Exception as error:
+            broadcast["failed"] += 1
+            logging.error("Error on broadcast to %s: %s", chat, str(error))
+
+    def _process(self, broadcast):
+        """
+        Send broadcast starting from saved position.
+        """
+        while broadcast["position"] < len(broadcast["chats"]):
+            self._send(broadcast, broadcast["chats"][broadcast["position"]])
+            broadcast["position"] += 1
+            if not self._storage.update_broadcast(
+                broadcast, self._owner, time.time() + LEASE_TIME
+            ):
+                logging.error("Broadcast was taken by other worker")
+                return
+        self._storage.update_broadcast(
+            broadcast, self._owner, time.time() + LEASE_TIME, done=True
+        )
+        logging.debug(
+            self._bot.send_message(
+                broadcast["admin_chat"],
+                self._report.format(broadcast["delivered"], broadcast["failed"]),
+            )
+        )
+
+    def _work(self):
+        """
+        Sending broadcasts forever.
+        """
+        while True:
+            try:
+                broadcast = self._storage.claim_broadcast(
+                    self._owner, time.time() + LEASE_TIME
+                )
+                if broadcast is None:
+                    self._event.wait(POLL_TIME)
+                    self._event.clear()
+                    continue
+                self._process(broadcast)
+            except Exception as error:
+                logging.error("Error on broadcast: %s", str(error))
+                time.sleep(POLL_TIME)
@@ -0,0 +1,114 @@
+"""
+Caching of data, received from schools.by.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache, where every entry has own time to live.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stale=False):
+        """
+        Get value by key, None if there is no value or it is expired.
+        Expired values are kept until they are evicted and returned, if stale is set.
+        """
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            expires, value = self._data[key]
+            if not stale and expires < time.monotonic():
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        """
+        Save value for ttl seconds, removing least recently used entries.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, check):
+        """
+        Remove all entries, which keys satisfy check.
+        """
+        with self._lock:
+            for key in [key for key in self._data if check(key)]:
+                del self._data[key]
+
+    def stats(self):
+        """
+        Get number of entries, hits and misses.
+        """
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """
+    Runs only one call with the same key at a time,
+    other callers wait for it and get the same result.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args):
+        """
+        Call function or wait for result of the same call in other thread.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = Future()
+                leader = True
+        if not leader:
+            return call.result()
+        try:
+            result = function(*args)
+        except BaseException as error:
+            call.set_exception(error)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,325 @@
+"""
+Cached access to pupils' daybooks.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import config
+from cache import SingleFlight, TTLCache
+from limits import FairScheduler, RateLimiter
+from models import load_lastpage, load_week
+from storage import Storage
+
+HOMETASK_CACHE = TTLCache(config.CACHE_SIZE)
+WEEK_CACHE = TTLCache(config.CACHE_SIZE)
+
+QUARTER_CACHE = TTLCache(config.CACHE_SIZE)
+LASTPAGE_CACHE = TTLCache(config.CACHE_SIZE)
+
+# Separate from database of users, as every write to it drops copies of users,
+# read by all processes.
+STORAGE = Storage(config.STATE_DATABASE)
+
+REQUESTS = SingleFlight()
+SCHEDULER = FairScheduler(config.UPSTREAM_SLOTS)
+LIMITER = RateLimiter(config.RATE_LIMIT, config.RATE_BURST)
+
+PREFETCH = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+WEEKS_POOL = ThreadPoolExecutor(
+    max_workers=config.QUARTER_WORKERS, thread_name_prefix="weeks"
+)
+
+MAX_QUARTER_WEEKS = 20
+FINAL_AFTER = datetime.timedelta(weeks=2)
+
+
+def _get_ttl(date):
+    """
+    Time to live for data of the day: past weeks are rarely changed.
+    """
+    today = datetime.date.today()
+    if date < today - datetime.timedelta(days=today.weekday()):
+        return config.CACHE_TTL_LONG
+    return config.CACHE_TTL_SHORT
+
+
+def _request(subdomain, request, token, *args):
+    """
+    Send request, when rate limit of school allows it and it's turn of user
+    with this token. Users of school take turns for its rate limit before
+    taking slot, so requests to busy school don't hold slots of other schools.
+    """
+    LIMITER.acquire(subdomain, token)
+    with SCHEDULER.slot(token):
+        return request(token, *args)
+
+
+def _download(key, page, subdomain, request, token, *args):
+    """
+    Request data and save it to database, if it's daybook page.
+    """
+    value = _request(subdomain, request, token, *args)
+    if page is not None:
+        STORAGE.save_page(key[0], page, value)
+    return value
+
+
+def _get_saved(pupil_id, page, load):
+    """
+    Get time, when page was saved to database, and its data.
+    """
+    saved = STORAGE.get_page(pupil_id, page)
+    if saved is None:
+        return None
+    return saved[0], load(saved[1])
+
+
+def _fetch(cache, key, ttl, subdomain, request, token, *args, page=None, load=None):
+    """
+    Request data and save it to cache.
+    Same requests with the same token, made at the same time, are sent only once,
+    so expired token of one account isn't reported to callers with other one.
+    If schools.by isn't available, expired data from cache
+    or data saved to database is returned.
+    Expired token is passed to caller, so it can be renewed.
+    """
+    try:
+        value = REQUESTS.do(
+            (request.__name__, token) + key,
+            _download,
+            key,
+            page,
+            subdomain,
+            request,
+            token,
+            *args,
+        )
+    except api.TokenExpired:
+        raise
+    except SystemError as error:
+        value = cache.get(key, stale=True)
+        if value is None and page is not None:
+            saved = _get_saved(key[0], page, load)
+            if saved is not None:
+                value = saved[1]
+        if value is None:
+            raise
+        logging.error("Returning stale data, as API isn't available: %s", str(error))
+        return value
+    cache.set(key, value, ttl)
+    return value
+
+
+def get_hometask(token, date, pupil_id, refresh=False, subdomain=None):
+    """
+    Get hometask by date (in format dd.mm.yy) for pupil.
+    Day is taken from the whole week, so other days of it are answered from cache.
+    """
+    day = datetime.datetime.strptime(date, "%d.%m.%y").date()
+    week = get_week(
+        token,
+        day - datetime.timedelta(days=day.weekday()),
+        pupil_id,
+        refresh,
+        subdomain,
+    )
+    if day.isoformat() in week.days:
+        return week.days[day.isoformat()]
+
+    logging.debug("No such day in week, requesting it separately")
+    key = (str(pupil_id), date)
+    if not refresh:
+        hometask = HOMETASK_CACHE.get(key)
+        if hometask is not None:
+            logging.debug("Got hometask from cache")
+            return hometask
+    return _fetch(
+        HOMETASK_CACHE,
+        key,
+        _get_ttl(day),
+        subdomain,
+        api.get_hometask,
+        token,
+        day,
+        pupil_id,
+    )
+
+
+def _get_final_week(key):
+    """
+    Get week from database, if it was saved long enough after its end,
+    so it won't be changed anymore.
+    """
+    pupil_id, date = key
+    final = datetime.datetime.combine(date + FINAL_AFTER, datetime.time())
+    if final > datetime.datetime.now():
+        return None
+    saved = _get_saved(pupil_id, date.isoformat(), load_week)
+    if saved is None or saved[0] < final.timestamp():
+        return None
+    return saved[1]
+
+
+def get_week(token, date, pupil_id, refresh=False, subdomain=None):
+    """
+    Get hometask on week, which starts with date.
+    """
+    key = (str(pupil_id), date)
+    if not refresh:
+        week = WEEK_CACHE.get(key)
+        if week is not None:
+            logging.debug("Got week from cache")
+            return week
+        week = _get_final_week(key)
+        if week is not None:
+            logging.debug("Got week from database")
+            WEEK_CACHE.set(key, week, config.CACHE_TTL_LONG)
+            return week
+    return _fetch(
+        WEEK_CACHE,
+        key,
+        _get_ttl(date),
+        subdomain,
+        api.get_week,
+        token,
+        date,
+        pupil_id,
+        page=date.isoformat(),
+        load=load_week,
+    )
+
+
+def _find_holidays(token, date, pupil_id, subdomain, step):
+    """
+    Find first week with holidays, going from date by step weeks.
+    Several weeks are requested at once to make less round-trips.
+    """
+    checked = 0
+    while checked < MAX_QUARTER_WEEKS:
+        dates = [
+            date + datetime.timedelta(weeks=step * (checked + number))
+            for number in range(config.QUARTER_WORKERS)
+        ]
+        weeks = WEEKS_POOL.map(
+            lambda week_date: get_week(token, week_date, pupil_id, subdomain=subdomain),
+            dates,
+        )
+        for week_date, week in zip(dates, weeks):
+            if week.holidays:
+                return week_date
+        checked += len(dates)
+    raise SystemError("Can't find holidays")
+
+
+def get_quarter(token, pupil_id, subdomain):
+    """
+    Get all weeks of current quarter.
+    Boundaries of quarter are the same for the whole school, so they are cached.
+    """
+    today = datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+
+    bounds = QUARTER_CACHE.get(subdomain)
+    if (
+        bounds is None
+        or not bounds[0] - datetime.timedelta(weeks=1) <= monday < bounds[1]
+    ):
+        logging.debug("Looking for a start of quarter")
+        start = _find_holidays(
+            token, monday, pupil_id, subdomain, -1
+        ) + datetime.timedelta(weeks=1)
+        logging.debug("Looking for an end of quarter")
+        end = _find_holidays(token, start, pupil_id, subdomain, 1)
+        bounds = (start, end)
+        QUARTER_CACHE.set(subdomain, bounds, config.CACHE_TTL_LONG)
+
+    dates = []
+    date = bounds[0]
+    while date < bounds[1]:
+        dates.append(date)
+        date += datetime.timedelta(weeks=1)
+    return list(
+        WEEKS_POOL.map(
+            lambda week_date: get_week(token, week_date, pupil_id, subdomain=subdomain),
+            dates,
+        )
+    )
+
+
+def get_lastpage(token, pupil_id, subdomain=None, refresh=False):
+    """
+    Get last daybook page.
+    """
+    key = (str(pupil_id),)
+    if not refresh:
+        lastpage = LASTPAGE_CACHE.get(key)
+        if lastpage is not None:
+            logging.debug("Got last page from cache")
+            return lastpage
+    return _fetch(
+        LASTPAGE_CACHE,
+        key,
+        config.CACHE_TTL_SHORT,
+        subdomain,
+        api.get_lastpage,
+        token,
+        pupil_id,
+        page="last-page",
+        load=load_lastpage,
+    )
+
+
+def _prefetch(token, date, pupil_id, subdomain):
+    """
+    Loading week to cache, logging errors, as nobody waits for result.
+    """
+    try:
+        get_week(token, date, pupil_id, subdomain=subdomain)
+    except Exception as error:
+        logging.error("Error on prefetching week: %s", str(error))
+
+
+def prefetch_week(token, date, pupil_id, subdomain=None):
+    """
+    Start loading week in background.
+    """
+    PREFETCH.submit(_prefetch, token, date, pupil_id, subdomain)
+
+
+def invalidate(pupil_id):
+    """
+    Remove all cached data of pupil.
+    """
+    HOMETASK_CACHE.invalidate(lambda key: key[0] == str(pupil_id))
+    WEEK_CACHE.invalidate(lambda key: key[0] == str(pupil_id))
+    LASTPAGE_CACHE.invalidate(lambda key: key[0] == str(pupil_id))
+
+
+def stats():
+    """
+    Get statistics of all caches.
+    """
+    return {
+        "hometask": HOMETASK_CACHE.stats(),
+        "week": WEEK_CACHE.stats(),
+        "quarter": QUARTER_CACHE.stats(),
+        "lastpage": LASTPAGE_CACHE.stats(),
+        "shared_requests": REQUESTS.shared,
+        "waiting_requests": SCHEDULER.waiting() + LIMITER.waiting(),
+    }
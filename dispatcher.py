@@ -0,0 +1,99 @@
+"""
+Processing updates from Telegram in background.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import os
+import queue
+import threading
+
+
+class UpdateQueue:
+    """
+    Bounded queue of updates, processed by pool of worker threads.
+    """
+
+    def __init__(self, process, workers, size):
+        self._process = process
+        self._workers = workers
+        self._queue = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+
+    def _start(self):
+        """
+        Start workers once in every process, as threads don't survive fork.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for number in range(self._workers):
+                threading.Thread(
+                    target=self._work, name="updates-" + str(number), daemon=True
+                ).start()
+
+    def _work(self):
+        """
+        Processing updates from queue.
+        """
+        while True:
+            update = self._queue.get()
+            try:
+                self._process([update])
+                with self._lock:
+                    self.processed += 1
+            except Exception as error:
+                with self._lock:
+                    self.failed += 1
+                logging.error("Error on processing update: %s", str(error))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, update):
+        """
+        Put update to queue, False if queue is full.
+        """
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(update)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            logging.error("Queue of updates is full")
+            return False
+        with self._lock:
+            self.accepted += 1
+        return True
+
+    def stats(self):
+        """
+        Get size of queue and number of processed updates.
+        """
+        return {
+            "depth": self._queue.qsize(),
+            "size": self._queue.maxsize,
+            "workers": self._workers,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,170 @@
+"""
+Keyboards, sent by bot.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import datetime
+import functools
+
+import telebot
+
+import config
+
+WEEKS = 64
+
+# Prefix of callback data, so its format can be changed later.
+VERSION = "v1"
+PUPIL = "p"
+WEEK = "w"
+DAY = "d"
+ALL = "a"
+PAGE = "g"
+
+
+def get_str_of_day(date, delta):
+    """
+    Generating string for date with some delta in format dd.mm.yy.
+    """
+    return (date + datetime.timedelta(days=delta)).strftime("%d.%m.%y")
+
+
+def pack_date(kind, date):
+    """
+    Callback data with kind and date, packed as yymmdd.
+    """
+    return VERSION + kind + date.strftime("%y%m%d")
+
+
+def pack_page(start_of_week, page, user_id):
+    """
+    Callback data to show page of home task on week,
+    which was requested by user with user_id.
+    """
+    return pack_date(PAGE, start_of_week) + str(page) + ":" + str(user_id)
+
+
+def pack_pupil(pupil_id):
+    """
+    Callback data to select pupil.
+    """
+    return VERSION + PUPIL + str(pupil_id)
+
+
+def _parse_legacy(data):
+    """
+    Parse callback data of keyboards, sent before data was packed.
+    """
+    if data[:3] == "ID:":
+        return PUPIL, int(data.split(" ")[1])
+    parts = data.split(" ")
+    if len(parts) == 3:
+        return WEEK, datetime.datetime.strptime(parts[0], "%d.%m.%y").date()
+    return DAY, datetime.datetime.strptime(data, "%d.%m.%y").date()
+
+
+def _unpack_date(value):
+    """
+    Get date, packed as yymmdd.
+    """
+    return datetime.date(2000 + int(value[:2]), int(value[2:4]), int(value[4:]))
+
+
+def parse(data):
+    """
+    Get kind and value from callback data, None if data isn't valid.
+    """
+    try:
+        if data[:2] != VERSION:
+            return _parse_legacy(data)
+        kind, value = data[2:3], data[3:]
+        if kind == PUPIL:
+            return kind, int(value)
+        if kind in (WEEK, DAY, ALL) and len(value) == 6:
+            return kind, _unpack_date(value)
+        if kind == PAGE and len(value) > 6:
+            page, user_id = value[6:].split(":")
+            return kind, (_unpack_date(value[:6]), int(page), int(user_id))
+    except (ValueError, IndexError):
+        pass
+    return None
+
+
+@functools.lru_cache(maxsize=WEEKS)
+def get_week(start_of_week):
+    """
+    Serialized keyboard with days of week, which starts with start_of_week,
+    button for the whole week and buttons to change week.
+    Same keyboard is sent to all users, so it's built only once.
+    """
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    keyboard.add(
+        telebot.types.InlineKeyboardButton(
+            text=get_str_of_day(start_of_week, -7)
+            + " - "
+            + get_str_of_day(start_of_week, -1),
+            callback_data=pack_date(WEEK, start_of_week - datetime.timedelta(days=7)),
+        )
+    )  # previous button.
+    for number in range(5):
+        keyboard.add(
+            telebot.types.InlineKeyboardButton(
+                text=get_str_of_day(start_of_week, number),
+                callback_data=pack_date(
+                    DAY, start_of_week + datetime.timedelta(days=number)
+                ),
+            )
+        )
+    keyboard.add(
+        telebot.types.InlineKeyboardButton(
+            text=config.WHOLE_WEEK, callback_data=pack_date(ALL, start_of_week)
+        )
+    )
+    keyboard.add(
+        telebot.types.InlineKeyboardButton(
+            text=get_str_of_day(start_of_week, 7)
+            + " - "
+            + get_str_of_day(start_of_week, 13),
+            callback_data=pack_date(WEEK, start_of_week + datetime.timedelta(days=7)),
+        )
+    )  # next button.
+    return keyboard.to_json()
+
+
+@functools.lru_cache(maxsize=WEEKS)
+def get_pages(start_of_week, page, count, user_id):
+    """
+    Serialized keyboard to switch pages of home task on week,
+    requested by user with user_id, None if there is only one page.
+    """
+    if count < 2:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(
+            telebot.types.InlineKeyboardButton(
+                text="« " + str(page) + "/" + str(count),
+                callback_data=pack_page(start_of_week, page - 1, user_id),
+            )
+        )
+    if page + 1 < count:
+        buttons.append(
+            telebot.types.InlineKeyboardButton(
+                text=str(page + 2) + "/" + str(count) + " »",
+                callback_data=pack_page(start_of_week, page + 1, user_id),
+            )
+        )
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    keyboard.row(*buttons)
+    return keyboard.to_json()
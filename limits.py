@@ -0,0 +1,167 @@
+"""
+Limiting requests to schools.by.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average and burst requests at once.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """
+        Take token, returns time to wait, if there is no tokens.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Wait until request can be sent.
+        """
+        delay = self._take()
+        while delay > 0:
+            time.sleep(delay)
+            delay = self._take()
+
+
+class RateLimiter:
+    """
+    Separate token bucket for every key, tokens are given to users in turn,
+    so user with many requests doesn't take turns of others.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, user):
+        """
+        Wait until request of user with key can be sent.
+        """
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = (
+                    TokenBucket(self.rate, self.burst),
+                    FairScheduler(1),
+                )
+            bucket, scheduler = self._buckets[key]
+        with scheduler.slot(user):
+            bucket.acquire()
+
+    def waiting(self):
+        """
+        Get number of requests, waiting for token.
+        """
+        with self._lock:
+            schedulers = [scheduler for _, scheduler in self._buckets.values()]
+        return sum(scheduler.waiting() for scheduler in schedulers)
+
+
+class FairScheduler:
+    """
+    Gives limited number of slots to users in turn,
+    so user with many requests waits for others instead of taking all slots.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._free = slots
+        self._waiting = {}
+        self._order = collections.deque()
+        self._condition = threading.Condition()
+
+    def _grant(self):
+        """
+        Give free slots to first waiting requests of users in turn.
+        """
+        granted = False
+        while self._free > 0 and self._order:
+            user = self._order.popleft()
+            tickets = self._waiting[user]
+            tickets.popleft()[0] = True
+            self._free -= 1
+            granted = True
+            if tickets:
+                self._order.append(user)
+            else:
+                del self._waiting[user]
+        if granted:
+            self._condition.notify_all()
+
+    def acquire(self, user):
+        """
+        Wait for the turn of user.
+        """
+        with self._condition:
+            if self._free > 0 and not self._order:
+                self._free -= 1
+                return
+            ticket = [False]
+            if user not in self._waiting:
+                self._waiting[user] = collections.deque()
+                self._order.append(user)
+            self._waiting[user].append(ticket)
+            while not ticket[0]:
+                self._condition.wait()
+
+    def release(self):
+        """
+        Return slot.
+        """
+        with self._condition:
+            self._free += 1
+            self._grant()
+
+    @contextlib.contextmanager
+    def slot(self, user):
+        """
+        Hold slot for user while request is sent.
+        """
+        self.acquire(user)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def waiting(self):
+        """
+        Get number of requests, waiting for slot.
+        """
+        with self._condition:
+            return sum(len(tickets) for tickets in self._waiting.values())
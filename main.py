@@ -15,20 +15,30 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import collections
 import datetime
 import logging
-import os
-import time
 
 import flask
-import requests
 import telebot
-import ujson
 from urllib3.exceptions import ProtocolError
 
+import accounts
 import config
-from api import auth, get_hometask, get_info, get_lastpage, get_pupils, get_week
+import daybook
+import keyboards
+import metrics
+import render
+from api import (
+    TokenExpired,
+    auth,
+    configure_base_url,
+    configure_session,
+    get_info,
+    get_pupils,
+)
+from broadcast import BroadcastQueue
+from dispatcher import UpdateQueue
+from storage import Storage, Users
 
 logging.basicConfig(
     filename="logging.log",
@@ -36,16 +46,22 @@ logging.basicConfig(
     level=logging.DEBUG,
 )
 
-if not os.path.isfile("database.json"):
-    with open("database.json", "w") as f:
-        f.write("{}")
-with open("database.json", "r", encoding="utf-8") as f:
-    TOKENS = ujson.load(f)
+DATABASE = Storage(config.DATABASE)
+TOKENS = Users(DATABASE)
+
+configure_session(config.POOL_SIZE)
+configure_base_url(config.SCHOOLS_BASE_URL)
 
 WEBHOOK_URL_BASE = "https://%s:%s" % (config.WEBHOOK_HOST, config.WEBHOOK_PORT)
 WEBHOOK_URL_PATH = "/%s/" % (config.TG_TOKEN)
 
-BOT = telebot.TeleBot(config.TG_TOKEN, parse_mode="MARKDOWN")
+BOT = telebot.TeleBot(config.TG_TOKEN, parse_mode="MARKDOWN", threaded=False)
+
+UPDATES = UpdateQueue(BOT.process_new_updates, config.WORKERS, config.QUEUE_SIZE)
+
+BROADCASTS = BroadcastQueue(
+    daybook.STORAGE, TOKENS, BOT, config.BROADCAST_RATE, config.BROADCAST_DONE
+)
 
 app = flask.Flask(__name__)
 
@@ -58,33 +74,39 @@ def webhook():
     if flask.request.headers.get("content-type") == "application/json":
         json_string = flask.request.get_data().decode("utf-8")
         update = telebot.types.Update.de_json(json_string)
-        BOT.process_new_updates([update])
+        BROADCASTS.start()
+        if not UPDATES.submit(update):
+            return "Busy", 503
         return ""
     flask.abort(403)
 
 
-@app.errorhandler(Exception)
-def handle_exception(error):
+@app.route("/status", methods=["GET"])
+def status():
     """
-    Logging all unhandled exceptions.
+    Showing state of queue and caches.
     """
-    logging.error(str(error))
-    return "Error", 500
+    return flask.jsonify(updates=UPDATES.stats(), cache=daybook.stats())
 
 
-def get_str_of_day(date, delta):
+@app.route("/metrics", methods=["GET"])
+def show_metrics():
     """
-    Generating string for date with some delta in format dd.mm.yy.
+    Showing metrics in Prometheus' format.
     """
-    return (date + datetime.timedelta(days=delta)).strftime("%d.%m.%y")
+    return flask.Response(
+        metrics.render(UPDATES.stats(), daybook.stats()),
+        mimetype="text/plain; version=0.0.4",
+    )
 
 
-def update_config():
+@app.errorhandler(Exception)
+def handle_exception(error):
     """
-    Updates local config, to cache some data.
+    Logging all unhandled exceptions.
     """
-    with open("database.json", "w") as fl_stream:
-        ujson.dump(TOKENS, fl_stream, ensure_ascii=False)
+    logging.error(str(error))
+    return "Error", 500
 
 
 def check_if_logged(message):
@@ -92,9 +114,7 @@ def check_if_logged(message):
     Check if logged and return id for TOKENS dict.
     """
     if not str(message.from_user.id) in TOKENS.keys():
-        if not str(message.chat.id) in TOKENS.keys():
-            return False
-        return str(message.chat.id)
+        return accounts.get_account(TOKENS, str(message.chat.id)) or False
     return str(message.from_user.id)
 
 
@@ -105,102 +125,130 @@ def write_to_log(message):
     logging.error("%s: %s", str(datetime.datetime.today()), str(message))
 
 
-def check_date(date):
-    """
-    Check if date is correct or not.
-    """
-    try:
-        datetime.datetime.strptime(date, "%d.%m.%y")
-    except ValueError:
-        return config.INCORRECT_FORMAT
-    if datetime.datetime.strptime(date, "%d.%m.%y").weekday() > 4:
-        return config.NOT_VALID
-    return "OK"
-
-
 def get_ht(date, message):
     """
-    Get hometask by date.
+    Get lines with hometask by date.
     """
     if not check_if_logged(message):
         logging.debug("No info to get home task for user")
-        return config.NO_INFO
+        return [config.NO_INFO]
 
     logging.debug("Trying to get pupil_id for home task")
     if TOKENS[check_if_logged(message)]["user_info"]["type"] == "Parent":
         try:
             pupil_id = TOKENS[check_if_logged(message)]["current"]
         except KeyError:
-            return config.PUPIL_NOT_SELECTED
+            return [config.PUPIL_NOT_SELECTED]
     else:
         pupil_id = TOKENS[check_if_logged(message)]["user_info"]["id"]
 
     logging.debug("Trying to get home task")
 
-    session = requests.Session()
-
     try:
-        hometask = get_hometask(
-            TOKENS[check_if_logged(message)]["token"], date, pupil_id, session
+        hometask = accounts.call(
+            TOKENS,
+            check_if_logged(message),
+            daybook.get_hometask,
+            date,
+            pupil_id,
+            subdomain=TOKENS[check_if_logged(message)]["user_info"]["subdomain"],
         )
+    except TokenExpired:
+        logging.debug("Token expired")
+        return [config.TOKEN_EXPIRED]
     except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
         logging.error("Error on get_hometask request to schools.by")
-        return config.SOMETHING_WENT_WRONG
+        return [config.SOMETHING_WENT_WRONG]
 
-    try:
-        logging.debug("Forming answer with home task")
-        string = ""
-        for row in hometask["lessons"].keys():
-            string += "`" + row + ". " + hometask["lessons"][row]["subject"] + ": "
-            if hometask["lessons"][row]["lesson_data"]["hometask"] is None or (
-                isinstance(
-                    hometask["lessons"][row]["lesson_data"]["hometask"]["text"],
-                    str,
-                )
-                and hometask["lessons"][row]["lesson_data"]["hometask"]["text"] == ""
-            ):
-                string += "Ничего\n`"
-            else:
-                string += hometask["lessons"][row]["lesson_data"]["hometask"]["text"]
-                if (
-                    not "not_transferred" in hometask["lessons"][row]["lesson_data"]
-                    or not "theme.text"
-                    in hometask["lessons"][row]["lesson_data"]["not_transferred"]
-                ):
-                    if hometask["lessons"][row]["lesson_data"][
-                        "theme"
-                    ] is not None and (
-                        isinstance(
-                            hometask["lessons"][row]["lesson_data"]["theme"]["text"],
-                            str,
-                        )
-                        and hometask["lessons"][row]["lesson_data"]["theme"]["text"]
-                        != ""
-                    ):
-                        string += (
-                            " Тема: "
-                            + hometask["lessons"][row]["lesson_data"]["theme"]["text"]
-                        )
-                if (
-                    len(
-                        hometask["lessons"][row]["lesson_data"]["hometask"][
-                            "attachments"
-                        ]
-                    )
-                    != 0
-                ):
-                    string += "`"
-                    for attachment in hometask["lessons"][row]["lesson_data"][
-                        "hometask"
-                    ]["attachments"]:
-                        string += "\n[Файл](" + str(attachment["file"]) + ")\n"
-                else:
-                    string += "`\n"
-        logging.debug("Returning answer:\n%s", string)
-        return string
-    except KeyError:
+    if hometask is None:
         logging.debug("Not a working day was requested")
-        return config.NOT_VALID
+        return [config.NOT_VALID]
+
+    logging.debug("Forming answer with home task")
+    return render.hometask(hometask)
+
+
+def get_week_ht(start_of_week, message):
+    """
+    Get lines with hometask on the whole week, requested at once.
+    """
+    if not check_if_logged(message):
+        logging.debug("No info to get home task on week for user")
+        return [config.NO_INFO]
+
+    logging.debug("Trying to get pupil_id for home task on week")
+    if TOKENS[check_if_logged(message)]["user_info"]["type"] == "Parent":
+        try:
+            pupil_id = TOKENS[check_if_logged(message)]["current"]
+        except KeyError:
+            return [config.PUPIL_NOT_SELECTED]
+    else:
+        pupil_id = TOKENS[check_if_logged(message)]["user_info"]["id"]
+
+    logging.debug("Trying to get home task on week")
+
+    try:
+        week = accounts.call(
+            TOKENS,
+            check_if_logged(message),
+            daybook.get_week,
+            start_of_week,
+            pupil_id,
+            subdomain=TOKENS[check_if_logged(message)]["user_info"]["subdomain"],
+        )
+    except TokenExpired:
+        logging.debug("Token expired")
+        return [config.TOKEN_EXPIRED]
+    except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
+        logging.error("Error on get_week request to schools.by")
+        return [config.SOMETHING_WENT_WRONG]
+
+    if not week.days:
+        logging.debug("Not a working week was requested")
+        return [config.NOT_VALID]
+
+    logging.debug("Forming answer with home task on week")
+    return render.week(week.days)
+
+
+def get_week_pages(start_of_week, message, user):
+    """
+    Get messages with hometask on the whole week for author of message,
+    mentioning user, who requested it.
+    """
+    return render.split(
+        get_week_ht(start_of_week, message),
+        render.mention(user)
+        + ", "
+        + str(config.HOMETASK_ON)
+        + " "
+        + keyboards.get_str_of_day(start_of_week, 0)
+        + " - "
+        + keyboards.get_str_of_day(start_of_week, 4)
+        + ":\n",
+    )
+
+
+def prefetch_week(message, start_of_week):
+    """
+    Start loading week, that will be probably requested soon.
+    """
+    key = check_if_logged(message)
+    if not key:
+        return
+    if TOKENS[key]["user_info"]["type"] == "Parent":
+        pupil_id = TOKENS[key].get("current")
+        if pupil_id is None:
+            return
+    else:
+        pupil_id = TOKENS[key]["user_info"]["id"]
+    if not TOKENS[key].get("expired"):
+        daybook.prefetch_week(
+            TOKENS[key]["token"],
+            start_of_week,
+            pupil_id,
+            TOKENS[key]["user_info"]["subdomain"],
+        )
 
 
 def check_for_credentials(message):
@@ -218,136 +266,95 @@ def check_for_credentials(message):
 
 def get_quarter(key):
     """
-    Getting marks.
+    Getting lines with marks.
     """
-    date = datetime.date.today() - datetime.timedelta(
-        days=datetime.date.today().weekday()
-    )
-
     logging.debug("Trying to get pupil_id for marks")
     if TOKENS[key]["user_info"]["type"] == "Parent":
         try:
             pupil_id = TOKENS[key]["current"]
         except KeyError:
-            return config.PUPIL_NOT_SELECTED
+            return [config.PUPIL_NOT_SELECTED]
     else:
         pupil_id = TOKENS[key]["user_info"]["id"]
 
-    marks = dict()
-
-    week = dict()
-
-    session = requests.Session()
-
-    logging.debug("Looking for a start of quarter")
-    while "holidays" not in week.keys():
-        try:
-            week = get_week(TOKENS[key]["token"], date, pupil_id, session)
-            date -= datetime.timedelta(days=7)
-        except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
-            logging.error("Error on get_week request to schools.by")
-            return config.SOMETHING_WENT_WRONG
-
-    date += datetime.timedelta(days=14)
-
-    week = dict()
-
-    logging.debug("Looking for an end of quarter")
-    while "holidays" not in week.keys():
-        try:
-            week = get_week(TOKENS[key]["token"], date, pupil_id, session)
-        except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
-            logging.error("Error on get_week request to schools.by")
-            return config.SOMETHING_WENT_WRONG
+    try:
+        weeks = accounts.call(
+            TOKENS,
+            key,
+            daybook.get_quarter,
+            pupil_id,
+            TOKENS[key]["user_info"]["subdomain"],
+        )
+    except TokenExpired:
+        logging.debug("Token expired")
+        return [config.TOKEN_EXPIRED]
+    except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
+        logging.error("Error on get_week request to schools.by")
+        return [config.SOMETHING_WENT_WRONG]
 
-        if "holidays" in week.keys():
-            break
+    marks = dict()
 
-        for day in week.keys():
-            for lesson in week[day]["lessons"].keys():
-                if (
-                    week[day]["lessons"][lesson]["mark"] == "н"
-                    or week[day]["lessons"][lesson]["mark"] is None
-                    or week[day]["lessons"][lesson]["mark"] == ""
-                ):
+    for week in weeks:
+        for day in week.days.values():
+            for lesson in day.lessons:
+                if lesson.mark in ("н", None, ""):
                     continue
-                if week[day]["lessons"][lesson]["subject"] not in marks.keys():
-                    marks[week[day]["lessons"][lesson]["subject"]] = list()
-                marks[week[day]["lessons"][lesson]["subject"]].append(
-                    week[day]["lessons"][lesson]["mark"]
-                )
-
-        date += datetime.timedelta(days=7)
-
-    marks = collections.OrderedDict(sorted(marks.items()))
+                if lesson.subject not in marks.keys():
+                    marks[lesson.subject] = list()
+                marks[lesson.subject].append(lesson.mark)
 
     logging.debug("Forming answer with marks")
-    answer = ""
-    for lesson in marks.keys():
-        answer += "`" + str(lesson) + ": "
-        for mark in marks[lesson]:
-            answer += mark + " "
-        answer = answer[:-1]
-        answer += "\n`"
-    return answer
+    return render.marks(sorted(marks.items()))
 
 
 def lastpage(key):
     """
-    Getting last page.
+    Getting lines with last page.
     """
     logging.debug("Trying to get pupil_id for last page")
     if TOKENS[key]["user_info"]["type"] == "Parent":
         try:
             pupil_id = TOKENS[key]["current"]
         except KeyError:
-            return config.PUPIL_NOT_SELECTED
+            return [config.PUPIL_NOT_SELECTED]
     else:
         pupil_id = TOKENS[key]["user_info"]["id"]
 
-    session = requests.Session()
-
-    response = get_lastpage(TOKENS[key]["token"], pupil_id, session)
-
-    marks = dict()
-
-    for row in response["rows"]:
-        marks[row["class_subject"]["subject"]] = {}
-        marks[row["class_subject"]["subject"]]["quarters"] = []
-        marks[row["class_subject"]["subject"]]["year_mark"] = row["year_mark"]
-        if marks[row["class_subject"]["subject"]]["year_mark"] is None:
-            marks[row["class_subject"]["subject"]]["year_mark"] = "-"
-        for number in row["quarter_marks"]:
-            if row["quarter_marks"][number] is None:
-                marks[row["class_subject"]["subject"]]["quarters"].append("-")
-                continue
-            marks[row["class_subject"]["subject"]]["quarters"].append(
-                row["quarter_marks"][number]["m"]
-            )
-
-    marks = collections.OrderedDict(sorted(marks.items()))
+    try:
+        response = accounts.call(
+            TOKENS,
+            key,
+            daybook.get_lastpage,
+            pupil_id,
+            TOKENS[key]["user_info"]["subdomain"],
+        )
+    except TokenExpired:
+        logging.debug("Token expired")
+        return [config.TOKEN_EXPIRED]
+    except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
+        logging.error("Error on get_lastpage request to schools.by")
+        return [config.SOMETHING_WENT_WRONG]
 
     logging.debug("Forming answer with last page")
-    answer = ""
-    for lesson in marks.keys():
-        answer += "`" + str(lesson) + ": "
-        for mark in marks[lesson]["quarters"]:
-            answer += mark + " "
-        answer += "| " + str(marks[lesson]["year_mark"]) + "\n`"
-    return answer
+    return render.lastpage(
+        sorted(response.subjects, key=lambda subject: subject.subject)
+    )
 
 
 @BOT.message_handler(commands=["send"])
+@metrics.handler
 def send(message):
     """
     Send some message to all users of the bot, but only from admin's chat.
     """
     if message.chat.id == config.ADMIN_CHAT_ID:
-        for chat in TOKENS.keys():
-            BOT.send_message(int(chat), message.text[6:], disable_notification=True)
+        BROADCASTS.add(message.chat.id, message.text[6:])
+        logging.debug("Broadcast added")
+        logging.debug(BOT.reply_to(message, config.BROADCAST_QUEUED))
 
 
 @BOT.message_handler(commands=["start", "help"])
+@metrics.handler
 def info(message):
     """
     Send message with info of bot.
@@ -372,17 +379,18 @@ def info(message):
 
 
 @BOT.message_handler(commands=["stop"])
+@metrics.handler
 def stop(message):
     """
     Stops bot by removing chat from database.
     """
     del TOKENS[str(message.chat.id)]
-    update_config()
     logging.debug("Removed chat from database")
     logging.debug(BOT.reply_to(message, config.REMOVED))
 
 
 @BOT.message_handler(func=check_for_credentials)
+@metrics.handler
 def getting_token(message):
     """
     Authenticating user.
@@ -393,10 +401,9 @@ def getting_token(message):
     logging.debug("Sending message, that will be edited")
     message_from_bot = BOT.send_message(message.chat.id, config.PLEASE_WAIT)
     logging.debug(message_from_bot)
-    session = requests.Session()
     try:
         logging.debug("Trying to auth user")
-        token = auth(*message.text.split(" "), session)
+        token = auth(*message.text.split(" "))
     except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
         logging.error("Error on auth request to schools.by")
         logging.debug(
@@ -418,13 +425,10 @@ def getting_token(message):
         )
         return
 
-    TOKENS[str(message.from_user.id)] = dict()
-    TOKENS[str(message.from_user.id)]["token"] = token
+    user = accounts.create_user(token, *message.text.split(" "))
 
     try:
-        TOKENS[str(message.from_user.id)]["user_info"] = get_info(
-            TOKENS[str(message.from_user.id)]["token"], session
-        )
+        user["user_info"] = get_info(user["token"])
     except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
         logging.error("Error on get_info request to schools.by")
         logging.debug(
@@ -436,11 +440,9 @@ def getting_token(message):
         )
         return
 
-    if TOKENS[str(message.from_user.id)]["user_info"]["type"] == "Parent":
+    if user["user_info"]["type"] == "Parent":
         try:
-            TOKENS[str(message.from_user.id)]["pupils"] = get_pupils(
-                token, TOKENS[str(message.from_user.id)]["user_info"]["id"], session
-            )
+            user["pupils"] = get_pupils(token, user["user_info"]["id"])
         except (SystemError, ConnectionError, ConnectionResetError, ProtocolError):
             logging.error("Error on get_pupils request to schools.by")
             logging.debug(
@@ -452,22 +454,30 @@ def getting_token(message):
             )
             return
 
+    if user["user_info"]["type"] == "Parent":
+        for pupil in user["pupils"]:
+            daybook.invalidate(pupil["id"])
+    else:
+        daybook.invalidate(user["user_info"]["id"])
+
+    TOKENS[str(message.from_user.id)] = user
+
     logging.debug("Replying, that user is authenticated")
     logging.debug(
         BOT.edit_message_text(
             chat_id=message_from_bot.chat.id,
             message_id=message_from_bot.message_id,
             text=config.LOGGED_IN.format(
-                TOKENS[str(message.from_user.id)]["user_info"]["last_name"],
-                TOKENS[str(message.from_user.id)]["user_info"]["first_name"],
-                TOKENS[str(message.from_user.id)]["user_info"]["subdomain"],
+                user["user_info"]["last_name"],
+                user["user_info"]["first_name"],
+                user["user_info"]["subdomain"],
             ),
         )
     )
-    update_config()
 
 
 @BOT.message_handler(commands=["marks"])
+@metrics.handler
 def get_marks(message):
     """
     Replying to message in Telegram.
@@ -483,16 +493,20 @@ def get_marks(message):
     logging.debug("Replying with marks")
     bots_message = BOT.reply_to(message, config.PLEASE_WAIT)
     logging.debug(bots_message)
+    messages = render.split(get_quarter(check_if_logged(message)))
     logging.debug(
         BOT.edit_message_text(
             chat_id=bots_message.chat.id,
             message_id=bots_message.message_id,
-            text=get_quarter(check_if_logged(message)),
+            text=messages[0],
         )
     )
+    for text in messages[1:]:
+        logging.debug(BOT.send_message(message.chat.id, text))
 
 
 @BOT.message_handler(commands=["lastpage"])
+@metrics.handler
 def last(message):
     """
     Replying to /lastpage command.
@@ -508,16 +522,20 @@ def last(message):
     logging.debug("Replying with last page")
     bots_message = BOT.reply_to(message, config.PLEASE_WAIT)
     logging.debug(bots_message)
+    messages = render.split(lastpage(check_if_logged(message)))
     logging.debug(
         BOT.edit_message_text(
             chat_id=bots_message.chat.id,
             message_id=bots_message.message_id,
-            text=lastpage(check_if_logged(message)),
+            text=messages[0],
         )
     )
+    for text in messages[1:]:
+        logging.debug(BOT.send_message(message.chat.id, text))
 
 
 @BOT.message_handler(commands=["login"])
+@metrics.handler
 def login(message):
     """
     Replying to /login command.
@@ -535,68 +553,62 @@ def login(message):
 
 
 @BOT.message_handler(commands=["set"])
+@metrics.handler
 def set_default(message):
     """
     Setting default diary for chat.
     """
-    if not check_if_logged(message):
+    if str(message.from_user.id) not in TOKENS:
         logging.debug("No info for seting as default")
         logging.debug(BOT.reply_to(message, config.NO_INFO))
         return
-    logging.debug("Setting to default")
-    TOKENS[str(message.chat.id)] = TOKENS[str(message.from_user.id)]
-    update_config()
+    if message.chat.id != message.from_user.id:
+        logging.debug("Setting to default")
+        chat = {"owner": str(message.from_user.id)}
+        if "notify" in TOKENS.get(str(message.chat.id), {}):
+            chat["notify"] = TOKENS[str(message.chat.id)]["notify"]
+        TOKENS[str(message.chat.id)] = chat
     logging.debug("Replying to inform, that user is now default for chat")
     logging.debug(BOT.reply_to(message, "Ok", disable_notification=True))
 
 
+@BOT.message_handler(commands=["notify"])
+@metrics.handler
+def notify(message):
+    """
+    Turning on and off notifications about new home tasks and marks in chat.
+    """
+    if str(message.chat.id) not in TOKENS:
+        logging.debug("No info for notifications")
+        logging.debug(BOT.reply_to(message, config.NO_INFO))
+        return
+    chat = TOKENS[str(message.chat.id)]
+    chat["notify"] = not chat.get("notify", False)
+    TOKENS[str(message.chat.id)] = chat
+    logging.debug("Replying about notifications")
+    logging.debug(
+        BOT.reply_to(
+            message,
+            config.NOTIFY_ON if chat["notify"] else config.NOTIFY_OFF,
+            disable_notification=True,
+        )
+    )
+
+
 @BOT.message_handler(commands=["hometask"])
+@metrics.handler
 def send_hometask(message):
     """
     Sending message with dates to choose.
     """
     today = datetime.date.today()
     start_of_week = today - datetime.timedelta(days=today.weekday())  # Monday
-    keyboard = telebot.types.InlineKeyboardMarkup()
-    logging.debug("Configuring reply keyboard")
-    keyboard.add(
-        telebot.types.InlineKeyboardButton(
-            text=(start_of_week - datetime.timedelta(days=7)).strftime("%d.%m.%y")
-            + " - "
-            + (start_of_week - datetime.timedelta(days=1)).strftime("%d.%m.%y"),
-            callback_data=(start_of_week - datetime.timedelta(days=7)).strftime(
-                "%d.%m.%y"
-            )
-            + " - "
-            + (start_of_week - datetime.timedelta(days=1)).strftime("%d.%m.%y"),
-        )
-    )  # previous button.
-    for i in range(5):
-        keyboard.add(
-            telebot.types.InlineKeyboardButton(
-                text=(start_of_week + datetime.timedelta(days=i)).strftime("%d.%m.%y"),
-                callback_data=(start_of_week + datetime.timedelta(days=i)).strftime(
-                    "%d.%m.%y"
-                ),
-            )
-        )
-    keyboard.add(
-        telebot.types.InlineKeyboardButton(
-            text=(start_of_week + datetime.timedelta(days=7)).strftime("%d.%m.%y")
-            + " - "
-            + (start_of_week + datetime.timedelta(days=13)).strftime("%d.%m.%y"),
-            callback_data=(start_of_week + datetime.timedelta(days=7)).strftime(
-                "%d.%m.%y"
-            )
-            + " - "
-            + (start_of_week + datetime.timedelta(days=13)).strftime("%d.%m.%y"),
-        )
-    )  # next_button.
+    prefetch_week(message, start_of_week)
     logging.debug("Answering to message with dates")
     bots_message = BOT.reply_to(
         message,
         config.CHOOSE_DATE,
-        reply_markup=keyboard,
+        reply_markup=keyboards.get_week(start_of_week),
         disable_notification=True,
     )
     logging.debug(bots_message)
@@ -609,7 +621,30 @@ def send_hometask(message):
         )
 
 
+@BOT.message_handler(commands=["week"])
+@metrics.handler
+def send_week(message):
+    """
+    Sending home task on the current week.
+    """
+    today = datetime.date.today()
+    start_of_week = today - datetime.timedelta(days=today.weekday())  # Monday
+    pages = get_week_pages(start_of_week, message, message.from_user)
+    logging.debug("Answering to message with home task on week")
+    logging.debug(
+        BOT.reply_to(
+            message,
+            pages[0],
+            reply_markup=keyboards.get_pages(
+                start_of_week, 0, len(pages), message.from_user.id
+            ),
+            disable_notification=True,
+        )
+    )
+
+
 @BOT.message_handler(commands=["select"])
+@metrics.handler
 def select_pupil(message):
     """
     Selecting pupil.
@@ -628,7 +663,7 @@ def select_pupil(message):
         keyboard.add(
             telebot.types.InlineKeyboardButton(
                 text=pupil["last_name"] + " " + pupil["first_name"],
-                callback_data="ID: " + str(pupil["id"]),
+                callback_data=keyboards.pack_pupil(pupil["id"]),
             )
         )
     logging.debug("Answering to message with pupils")
@@ -642,156 +677,228 @@ def select_pupil(message):
     )
 
 
-@BOT.callback_query_handler(func=lambda call: True)
-def callback(call):
+@metrics.handler
+def select_callback(call, pupil_id):
     """
-    Answering for Telegram's callback.
+    Setting default pupil.
     """
-    logging.debug("Starting processing callback %s", str(call.data))
-    if call.data[:3] == "ID:":
-        logging.debug("Setting default pupil")
-        pupil_id = int(call.data.split(" ")[1])
-        TOKENS[check_if_logged(call.message.reply_to_message)]["current"] = pupil_id
-        update_config()
-        pupil_name = None
-        for pupil in TOKENS[check_if_logged(call.message.reply_to_message)]["pupils"]:
-            if int(pupil["id"]) == pupil_id:
-                pupil_name = pupil["last_name"] + " " + pupil["first_name"]
-                break
-        logging.debug("Answering to callback to set pupil")
-        logging.debug(
-            BOT.answer_callback_query(
-                call.id, show_alert=False, text=config.SELECTED_PUPIL.format(pupil_name)
-            )
+    logging.debug("Setting default pupil")
+    user = TOKENS[check_if_logged(call.message.reply_to_message)]
+    user["current"] = pupil_id
+    TOKENS[check_if_logged(call.message.reply_to_message)] = user
+    pupil_name = None
+    for pupil in user["pupils"]:
+        if int(pupil["id"]) == pupil_id:
+            pupil_name = pupil["last_name"] + " " + pupil["first_name"]
+            break
+    logging.debug("Answering to callback to set pupil")
+    logging.debug(
+        BOT.answer_callback_query(
+            call.id, show_alert=False, text=config.SELECTED_PUPIL.format(pupil_name)
+        )
+    )
+
+
+@metrics.handler
+def week_callback(call, start_of_week):
+    """
+    Changing week.
+    """
+    logging.debug("Changing week")
+    prefetch_week(call.message.reply_to_message, start_of_week)
+
+    logging.debug("Editing previous message to change week")
+    logging.debug(
+        BOT.edit_message_reply_markup(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            reply_markup=keyboards.get_week(start_of_week),
         )
-    elif len(call.data.split(" ")) == 3:
-        logging.debug("Changing week")
-        start_of_week = datetime.datetime.strptime(
-            str(call.data).split(" ")[0], "%d.%m.%y"
+    )
+    logging.debug("Answering to callback to change week")
+    logging.debug(
+        BOT.answer_callback_query(
+            call.id, show_alert=False, text=config.WEEK_CHANGE_TEXT
         )
-        keyboard = telebot.types.InlineKeyboardMarkup()
-        keyboard.add(
-            telebot.types.InlineKeyboardButton(
-                text=get_str_of_day(start_of_week, -7)
-                + " - "
-                + get_str_of_day(start_of_week, -1),
-                callback_data=get_str_of_day(start_of_week, -7)
-                + " - "
-                + get_str_of_day(start_of_week, -1),
-            )
-        )  # previous button.
-        for number in range(5):
-            keyboard.add(
-                telebot.types.InlineKeyboardButton(
-                    text=get_str_of_day(start_of_week, number),
-                    callback_data=get_str_of_day(start_of_week, number),
-                )
-            )
-        keyboard.add(
-            telebot.types.InlineKeyboardButton(
-                text=get_str_of_day(start_of_week, 7)
-                + " - "
-                + get_str_of_day(start_of_week, 13),
-                callback_data=get_str_of_day(start_of_week, 7)
-                + " - "
-                + get_str_of_day(start_of_week, 13),
-            )
-        )  # next_button.
+    )
+
+
+def send_error(call, error):
+    """
+    Sending error to user, who pressed button.
+    """
+    logging.debug(
+        BOT.send_message(
+            call.message.chat.id,
+            render.mention(call.from_user) + ", " + error,
+            disable_notification=True,
+        )
+    )
 
-        logging.debug("Editing previous message to change week")
+
+@metrics.handler
+def day_callback(call, date):
+    """
+    Sending home task.
+    """
+    logging.debug("Getting home task")
+    if date.weekday() > 4:
+        send_error(call, config.NOT_VALID)
+        return
+    date = date.strftime("%d.%m.%y")
+    write_to_log(
+        str(call.from_user.first_name)
+        + " "
+        + str(call.from_user.last_name)
+        + " "
+        + str(call.from_user.username)
+        + " "
+        + str(call.from_user.id)
+        + " Chat id : "
+        + str(call.message.chat.id)
+    )
+    logging.debug("Sending hometask")
+    for text in render.split(
+        get_ht(date, call.message.reply_to_message),
+        render.mention(call.from_user)
+        + ", "
+        + str(config.HOMETASK_ON)
+        + " "
+        + date
+        + ":\n",
+    ):
         logging.debug(
-            BOT.edit_message_reply_markup(
-                chat_id=call.message.chat.id,
-                message_id=call.message.message_id,
-                reply_markup=keyboard,
+            BOT.send_message(
+                call.message.chat.id,
+                text=text,
+                disable_notification=True,
             )
         )
-        logging.debug("Answering to callback to change week")
+    logging.debug("Answering to callback from home task")
+    if str(call.from_user.id) in config.CUSTOM_TEXT.keys():
         logging.debug(
             BOT.answer_callback_query(
-                call.id, show_alert=False, text=config.WEEK_CHANGE_TEXT
+                call.id,
+                show_alert=False,
+                text=config.ANSWER_TEXT + config.CUSTOM_TEXT[str(call.from_user.id)],
             )
         )
     else:
-        logging.debug("Getting home task")
-        if check_date(call.data) != "OK":
-            logging.debug(
-                BOT.send_message(
-                    call.message.chat.id,
-                    "["
-                    + str(call.from_user.first_name)
-                    + "](tg://user?id="
-                    + str(call.from_user.id)
-                    + "), "
-                    + check_date(call.data),
-                    disable_notification=True,
-                )
-            )
-            return
-        write_to_log(
-            str(call.from_user.first_name)
-            + " "
-            + str(call.from_user.last_name)
-            + " "
-            + str(call.from_user.username)
-            + " "
-            + str(call.from_user.id)
-            + " Chat id : "
-            + str(call.message.chat.id)
-        )
-        logging.debug("Sending hometask")
         logging.debug(
-            BOT.send_message(
-                call.message.chat.id,
-                text="["
-                + str(call.from_user.first_name)
-                + "](tg://user?id="
-                + str(call.from_user.id)
-                + "), "
-                + str(config.HOMETASK_ON)
-                + " "
-                + str(call.data)
-                + ":\n"
-                + get_ht(call.data, call.message.reply_to_message),
-                disable_notification=True,
+            BOT.answer_callback_query(
+                call.id,
+                show_alert=False,
+                text=config.ANSWER_TEXT,
             )
         )
-        logging.debug("Answering to callback from home task")
-        if str(call.from_user.id) in config.CUSTOM_TEXT.keys():
-            logging.debug(
-                BOT.answer_callback_query(
-                    call.id,
-                    show_alert=False,
-                    text=config.ANSWER_TEXT
-                    + config.CUSTOM_TEXT[str(call.from_user.id)],
-                )
-            )
-        else:
-            logging.debug(
-                BOT.answer_callback_query(
-                    call.id,
-                    show_alert=False,
-                    text=config.ANSWER_TEXT,
-                )
-            )
 
 
-commands = []
-for command in config.COMMANDS.keys():
-    commands.append(telebot.types.BotCommand(command, config.COMMANDS[command]))
+@metrics.handler
+def week_ht_callback(call, start_of_week):
+    """
+    Sending home task on the whole week.
+    """
+    logging.debug("Getting home task on week")
+    pages = get_week_pages(start_of_week, call.message.reply_to_message, call.from_user)
+    logging.debug("Sending home task on week")
+    logging.debug(
+        BOT.send_message(
+            call.message.chat.id,
+            pages[0],
+            reply_to_message_id=call.message.reply_to_message.message_id,
+            reply_markup=keyboards.get_pages(
+                start_of_week, 0, len(pages), call.from_user.id
+            ),
+            disable_notification=True,
+        )
+    )
+    logging.debug("Answering to callback from home task on week")
+    logging.debug(
+        BOT.answer_callback_query(call.id, show_alert=False, text=config.ANSWER_TEXT)
+    )
 
-BOT.set_my_commands(commands)
 
-BOT.remove_webhook()
+@metrics.handler
+def page_callback(call, value):
+    """
+    Showing other page of home task on week.
+    """
+    start_of_week, page, user_id = value
+    logging.debug("Changing page of home task on week")
+    user = call.from_user
+    if user.id != user_id:
+        user = BOT.get_chat_member(call.message.chat.id, user_id).user
+    pages = get_week_pages(start_of_week, call.message.reply_to_message, user)
+    page = min(page, len(pages) - 1)
+    logging.debug(
+        BOT.edit_message_text(
+            pages[page],
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            reply_markup=keyboards.get_pages(start_of_week, page, len(pages), user_id),
+        )
+    )
+    logging.debug(BOT.answer_callback_query(call.id, show_alert=False))
 
-time.sleep(1)
 
-BOT.set_webhook(
-    url=WEBHOOK_URL_BASE + WEBHOOK_URL_PATH,
-    certificate=open(config.WEBHOOK_SSL_CERT, "r"),
-)
+CALLBACKS = {
+    keyboards.PUPIL: select_callback,
+    keyboards.WEEK: week_callback,
+    keyboards.DAY: day_callback,
+    keyboards.ALL: week_ht_callback,
+    keyboards.PAGE: page_callback,
+}
+
+
+@BOT.callback_query_handler(func=lambda call: True)
+@metrics.handler
+def callback(call):
+    """
+    Answering for Telegram's callback.
+    """
+    logging.debug("Starting processing callback %s", str(call.data))
+    parsed = keyboards.parse(str(call.data))
+    if parsed is None:
+        send_error(call, config.INCORRECT_FORMAT)
+        return
+    CALLBACKS[parsed[0]](call, parsed[1])
+
+
+def bootstrap():
+    """
+    Migrating database and registering commands and webhook in Telegram.
+    Run once per deployment, nothing is changed, if Telegram already has it.
+    """
+    DATABASE.migrate("database.json")
+    accounts.link_chats(TOKENS)
+
+    commands = []
+    for command in config.COMMANDS.keys():
+        commands.append(telebot.types.BotCommand(command, config.COMMANDS[command]))
+    if [command.to_dict() for command in BOT.get_my_commands()] != [
+        command.to_dict() for command in commands
+    ]:
+        logging.info("Setting commands")
+        BOT.set_my_commands(commands)
+
+    if BOT.get_webhook_info().url != WEBHOOK_URL_BASE + WEBHOOK_URL_PATH:
+        logging.info("Setting webhook")
+        with open(config.WEBHOOK_SSL_CERT, "r") as certificate:
+            BOT.set_webhook(
+                url=WEBHOOK_URL_BASE + WEBHOOK_URL_PATH, certificate=certificate
+            )
+
+
+@app.cli.command("bootstrap")
+def bootstrap_command():
+    """
+    Prepare bot before starting workers.
+    """
+    bootstrap()
+
 
 if __name__ == "__main__":
+    bootstrap()
     app.run(
         host=config.WEBHOOK_LISTEN,
         port=config.LISTEN_PORT,
@@ -0,0 +1,213 @@
+"""
+Metrics of bot in Prometheus' text format.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import bisect
+import functools
+import threading
+import time
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _render_values(name, description, kind, label, values):
+    """
+    Lines of metric with values, which are taken from other statistics.
+    """
+    lines = ["# HELP " + name + " " + description, "# TYPE " + name + " " + kind]
+    for value, number in sorted(values.items()):
+        lines.append('{}{{{}="{}"}} {}'.format(name, label, value, number))
+    return lines
+
+
+class Counter:
+    """
+    Counts events by value of one label.
+    """
+
+    def __init__(self, name, description, label):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value, amount=1):
+        """
+        Count amount of events with label value.
+        """
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def render(self):
+        """
+        Lines of counter in text format.
+        """
+        with self._lock:
+            values = dict(self._values)
+        return _render_values(
+            self.name, self.description, "counter", self.label, values
+        )
+
+
+class Histogram:
+    """
+    Distribution of durations by value of one label.
+    """
+
+    def __init__(self, name, description, label, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        """
+        Add duration of event with label value.
+        """
+        with self._lock:
+            if value not in self._values:
+                self._values[value] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = self._values[value]
+            counts[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            counts[1] += seconds
+
+    def render(self):
+        """
+        Lines of histogram in text format, buckets are cumulative.
+        """
+        lines = [
+            "# HELP " + self.name + " " + self.description,
+            "# TYPE " + self.name + " histogram",
+        ]
+        with self._lock:
+            for value, (counts, total) in sorted(self._values.items()):
+                label = '{}="{}"'.format(self.label, value)
+                count = 0
+                for bucket, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    count += bucket_count
+                    lines.append(
+                        '{}_bucket{{{},le="{}"}} {}'.format(
+                            self.name, label, bucket, count
+                        )
+                    )
+                lines.append("{}_sum{{{}}} {}".format(self.name, label, total))
+                lines.append("{}_count{{{}}} {}".format(self.name, label, count))
+        return lines
+
+
+HANDLER_TIME = Histogram(
+    "hometasker_handler_seconds", "Time of processing command.", "handler"
+)
+HANDLER_ERRORS = Counter(
+    "hometasker_handler_errors_total", "Errors on processing command.", "handler"
+)
+API_TIME = Histogram(
+    "hometasker_api_seconds", "Time of request to schools.by.", "endpoint"
+)
+API_ERRORS = Counter(
+    "hometasker_api_errors_total", "Errors on request to schools.by.", "endpoint"
+)
+
+
+def timed(histogram, errors, value):
+    """
+    Decorator, which measures time of function and counts its exceptions.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                errors.inc(value)
+                raise
+            finally:
+                histogram.observe(value, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def handler(function):
+    """
+    Measure command handler.
+    """
+    return timed(HANDLER_TIME, HANDLER_ERRORS, function.__name__)(function)
+
+
+def endpoint(function):
+    """
+    Measure request to schools.by.
+    """
+    return timed(API_TIME, API_ERRORS, function.__name__)(function)
+
+
+def render(updates, caches):
+    """
+    All metrics in text format.
+    updates and caches are statistics of update queue and daybook.
+    """
+    lines = []
+    for metric in (HANDLER_TIME, HANDLER_ERRORS, API_TIME, API_ERRORS):
+        lines.extend(metric.render())
+    lines.extend(
+        _render_values(
+            "hometasker_updates", "State of update queue.", "gauge", "state", updates
+        )
+    )
+    lines.extend(
+        _render_values(
+            "hometasker_upstream_requests",
+            "Requests to schools.by, shared by callers or waiting for turn.",
+            "gauge",
+            "state",
+            {
+                name: value
+                for name, value in caches.items()
+                if not isinstance(value, dict)
+            },
+        )
+    )
+    caches = {name: cache for name, cache in caches.items() if isinstance(cache, dict)}
+    for result in ("hits", "misses"):
+        lines.extend(
+            _render_values(
+                "hometasker_cache_" + result + "_total",
+                "Cache " + result + ".",
+                "counter",
+                "cache",
+                {name: cache[result] for name, cache in caches.items()},
+            )
+        )
+    lines.extend(
+        _render_values(
+            "hometasker_cache_hit_ratio",
+            "Part of requests, answered from cache.",
+            "gauge",
+            "cache",
+            {
+                name: cache["hits"] / max(cache["hits"] + cache["misses"], 1)
+                for name, cache in caches.items()
+            },
+        )
+    )
+    return "\n".join(lines) + "\n"
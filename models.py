@@ -0,0 +1,181 @@
+"""
+Compact representation of data from schools.by.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class Lesson(NamedTuple):
+    """
+    Lesson with fields, used by bot.
+    Hometask and theme are None, if they are empty or shouldn't be shown.
+    """
+
+    number: str
+    subject: str
+    hometask: Optional[str]
+    theme: Optional[str]
+    attachments: Tuple[str, ...]
+    mark: Optional[str]
+
+
+class Day(NamedTuple):
+    """
+    Lessons of the day, date is in format yyyy-mm-dd.
+    """
+
+    date: str
+    lessons: Tuple[Lesson, ...]
+
+
+class Week(NamedTuple):
+    """
+    Working days of the week by date in format yyyy-mm-dd.
+    """
+
+    holidays: bool
+    days: Dict[str, Day]
+
+
+class SubjectMarks(NamedTuple):
+    """
+    Marks for quarters and year, None if mark isn't set.
+    """
+
+    subject: str
+    quarters: Tuple[Optional[str], ...]
+    year: Optional[str]
+
+
+class QuarterMarks(NamedTuple):
+    """
+    Last page of daybook.
+    """
+
+    subjects: Tuple[SubjectMarks, ...]
+
+
+def _get_text(data):
+    """
+    Get text from hometask or theme, None if it is empty.
+    """
+    if data is None or not isinstance(data["text"], str) or data["text"] == "":
+        return None
+    return data["text"]
+
+
+def parse_lesson(number, data):
+    """
+    Create lesson from schools.by response.
+    """
+    lesson_data = data.get("lesson_data") or {}
+    hometask = lesson_data.get("hometask")
+    theme = None
+    if "theme.text" not in lesson_data.get("not_transferred", ()):
+        theme = _get_text(lesson_data.get("theme"))
+    attachments = ()
+    if hometask is not None:
+        attachments = tuple(
+            str(attachment["file"]) for attachment in hometask["attachments"]
+        )
+    return Lesson(
+        number,
+        data["subject"],
+        _get_text(hometask),
+        theme,
+        attachments,
+        data.get("mark"),
+    )
+
+
+def parse_day(date, data):
+    """
+    Create day from schools.by response, None if it isn't working day.
+    """
+    if not isinstance(data, dict) or "lessons" not in data:
+        return None
+    return Day(
+        date,
+        tuple(
+            parse_lesson(number, lesson) for number, lesson in data["lessons"].items()
+        ),
+    )
+
+
+def parse_week(data):
+    """
+    Create week from schools.by response.
+    """
+    days = {}
+    for date, day in data.items():
+        day = parse_day(date, day)
+        if day is not None:
+            days[date] = day
+    return Week("holidays" in data, days)
+
+
+def parse_lastpage(data):
+    """
+    Create last page from schools.by response.
+    """
+    subjects = []
+    for row in data["rows"]:
+        quarters = []
+        for number in row["quarter_marks"]:
+            if row["quarter_marks"][number] is None:
+                quarters.append(None)
+            else:
+                quarters.append(row["quarter_marks"][number]["m"])
+        subjects.append(
+            SubjectMarks(
+                row["class_subject"]["subject"], tuple(quarters), row["year_mark"]
+            )
+        )
+    return QuarterMarks(tuple(subjects))
+
+
+def load_day(data):
+    """
+    Create day from its JSON representation.
+    """
+    date, lessons = data
+    return Day(
+        date,
+        tuple(
+            Lesson(number, subject, hometask, theme, tuple(attachments), mark)
+            for number, subject, hometask, theme, attachments, mark in lessons
+        ),
+    )
+
+
+def load_week(data):
+    """
+    Create week from its JSON representation.
+    """
+    holidays, days = data
+    return Week(holidays, {date: load_day(day) for date, day in days.items()})
+
+
+def load_lastpage(data):
+    """
+    Create last page from its JSON representation.
+    """
+    return QuarterMarks(
+        tuple(
+            SubjectMarks(subject, tuple(quarters), year)
+            for subject, quarters, year in data[0]
+        )
+    )
@@ -0,0 +1,225 @@
+"""
+Sending notifications about new home tasks and marks.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import datetime
+import logging
+import time
+import zlib
+
+import telebot
+
+import accounts
+import api
+import config
+import daybook
+import render
+from limits import TokenBucket
+from storage import Storage, Users
+
+STORAGE = daybook.STORAGE
+USERS = Users(Storage(config.DATABASE))
+
+api.configure_base_url(config.SCHOOLS_BASE_URL)
+
+BOT = telebot.TeleBot(config.TG_TOKEN, parse_mode="MARKDOWN", threaded=False)
+
+MESSAGES = TokenBucket(config.NOTIFY_RATE, config.NOTIFY_RATE)
+
+
+def get_pupil_id(user):
+    """
+    Get id of pupil, which diary is used, None if pupil isn't selected.
+    """
+    if user["user_info"]["type"] == "Parent":
+        return user.get("current")
+    return user["user_info"]["id"]
+
+
+def get_state(week):
+    """
+    Get home task and mark of every lesson in week.
+    """
+    state = {}
+    for day in week.days.values():
+        for lesson in day.lessons:
+            state[day.date + " " + lesson.number] = [
+                lesson.subject,
+                lesson.hometask or "",
+                lesson.mark or "",
+            ]
+    return state
+
+
+def get_changes(old, new):
+    """
+    Get lines about new home tasks and marks.
+    """
+    lines = []
+    for key in sorted(new.keys()):
+        subject, text, mark = new[key]
+        old_text, old_mark = old.get(key, [None, "", ""])[1:]
+        date = datetime.date.fromisoformat(key.split(" ")[0]).strftime("%d.%m.%y")
+        if text != "" and text != old_text:
+            lines.append(
+                render.code(config.NEW_HOMETASK.format(date, subject, text)) + "\n"
+            )
+        if mark not in ("", "н") and mark != old_mark:
+            lines.append(
+                render.code(config.NEW_MARK.format(date, subject, mark)) + "\n"
+            )
+    return lines
+
+
+def get_subscribers():
+    """
+    Get chats, which want notifications, grouped by pupil.
+    """
+    pupils = {}
+    for key in USERS:
+        try:
+            chat = USERS[key]
+        except KeyError:
+            continue
+        account = accounts.get_account(USERS, key)
+        if not chat.get("notify") or account is None:
+            continue
+        pupil_id = get_pupil_id(USERS[account])
+        if pupil_id is None:
+            continue
+        pupils.setdefault(str(pupil_id), []).append(key)
+    return pupils
+
+
+def send(chat, text):
+    """
+    Send message without exceeding Telegram's limits.
+    Notifications are turned off for chats, where bot was blocked.
+    Returns False, if message wasn't sent because of temporary error.
+    """
+    MESSAGES.acquire()
+    try:
+        logging.debug(BOT.send_message(int(chat), text))
+    except telebot.apihelper.ApiTelegramException as error:
+        logging.error("Error on sending notification: %s", str(error))
+        if error.error_code == 403:
+            user = USERS[chat]
+            user["notify"] = False
+            USERS[chat] = user
+        return error.error_code != 429 and error.error_code < 500
+    except Exception as error:
+        logging.error("Error on sending notification: %s", str(error))
+        return False
+    return True
+
+
+def notify(chat, lines):
+    """
+    Send lines to chat, returns False, if not all messages were sent.
+    """
+    for text in render.split(lines):
+        if not send(chat, text):
+            return False
+    return True
+
+
+def check_pupil(pupil_id, chats, week_start):
+    """
+    Compare week with last seen state and notify chats about changes.
+    Changes, which weren't sent because of temporary error, are saved with state
+    and sent again in the next round only to chats, which didn't get them.
+    """
+    key = accounts.get_account(USERS, chats[0])
+    week = accounts.call(
+        USERS,
+        key,
+        daybook.get_week,
+        week_start,
+        pupil_id,
+        refresh=True,
+        subdomain=USERS[key]["user_info"]["subdomain"],
+    )
+    state = get_state(week)
+    snapshot = STORAGE.get_snapshot(pupil_id, week_start.isoformat())
+    if snapshot is None:
+        STORAGE.save_snapshot(
+            pupil_id, week_start.isoformat(), {"state": state, "pending": {}}
+        )
+        return
+    if snapshot["state"] == state and not snapshot["pending"]:
+        return
+    lines = get_changes(snapshot["state"], state)
+    pending = {}
+    for chat in chats:
+        chat_lines = snapshot["pending"].get(chat, []) + lines
+        if chat_lines and not notify(chat, chat_lines):
+            pending[chat] = chat_lines
+    STORAGE.save_snapshot(
+        pupil_id, week_start.isoformat(), {"state": state, "pending": pending}
+    )
+
+
+def get_offset(pupil_id):
+    """
+    Time from start of the round, when pupil is checked.
+    Pupils are spread over the interval, not to request schools.by at once.
+    """
+    return zlib.crc32(pupil_id.encode("utf-8")) % config.NOTIFY_INTERVAL
+
+
+def run_round():
+    """
+    Checking all pupils once.
+    """
+    start = time.monotonic()
+    today = datetime.date.today()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    if today.weekday() > 4:
+        week_start += datetime.timedelta(weeks=1)
+    pupils = get_subscribers()
+    for pupil_id in sorted(pupils.keys(), key=get_offset):
+        delay = start + get_offset(pupil_id) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            check_pupil(pupil_id, pupils[pupil_id], week_start)
+        except (SystemError, ConnectionError, KeyError) as error:
+            logging.error("Error on checking pupil: %s", str(error))
+    STORAGE.delete_snapshots((week_start - datetime.timedelta(weeks=1)).isoformat())
+    delay = start + config.NOTIFY_INTERVAL - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def run():
+    """
+    Checking pupils forever.
+    """
+    while True:
+        try:
+            run_round()
+        except Exception as error:
+            logging.error("Error on notifications round: %s", str(error))
+            time.sleep(config.NOTIFY_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        filename="notifier.log",
+        format="%(asctime)s - %(levelname)s: %(message)s",
+        level=logging.INFO,
+    )
+    run()
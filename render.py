@@ -0,0 +1,172 @@
+"""
+Forming answers of bot in Telegram's Markdown.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import datetime
+
+LIMIT = 4096
+
+ESCAPED = str.maketrans({char: "\\" + char for char in "_*`["})
+
+
+def escape(text):
+    """
+    Escape text outside of entities.
+    """
+    return text.translate(ESCAPED)
+
+
+# Start of link to attachment, formed once, as it's same for all files.
+FILE = "[" + escape("Файл") + "]("
+
+
+def code(text):
+    """
+    Inline code, backticks inside are put escaped between entities.
+    """
+    return "\\`".join("`" + part + "`" if part else "" for part in text.split("`"))
+
+
+def _code_lines(text):
+    """
+    Inline code with line end, too long text is put into several entities,
+    so message can be split between them.
+    """
+    size = LIMIT // 2
+    lines = []
+    start = 0
+    while start < len(text) or not lines:
+        end = min(len(text), start + size)
+        line = code(text[start:end])
+        while len(line) > size:
+            end -= (len(line) - size + 1) // 2
+            line = code(text[start:end])
+        lines.append(line + "\n")
+        start = end
+    return "".join(lines)
+
+
+def link(text, url):
+    """
+    Link, brackets in url are encoded not to end it.
+    """
+    return "[" + escape(text) + "](" + url.replace(")", "%29") + ")"
+
+
+def mention(user):
+    """
+    Link to Telegram's user.
+    """
+    return link(str(user.first_name), "tg://user?id=" + str(user.id))
+
+
+def hometask(day):
+    """
+    Lines with lessons of the day.
+    """
+    lines = []
+    for lesson in day.lessons:
+        parts = [lesson.number, ". ", lesson.subject, ": "]
+        if lesson.hometask is None:
+            parts.append("Ничего")
+        else:
+            parts.append(lesson.hometask)
+            if lesson.theme is not None:
+                parts.extend((" Тема: ", lesson.theme))
+        line = [_code_lines("".join(parts))]
+        for attachment in lesson.attachments:
+            line.append(FILE + attachment.replace(")", "%29") + ")\n")
+        lines.append("".join(line))
+    return lines
+
+
+def week(days):
+    """
+    Lines with lessons of all days, every day starts with its date.
+    """
+    lines = []
+    for date in sorted(days.keys()):
+        title = "*" + datetime.date.fromisoformat(date).strftime("%d.%m.%y") + "*\n"
+        day = hometask(days[date]) or [""]
+        day[0] = title + day[0]
+        lines.extend(day)
+    return lines
+
+
+def marks(subjects):
+    """
+    Lines with marks by subject.
+    """
+    return [
+        code(subject + ": " + " ".join(subject_marks)) + "\n"
+        for subject, subject_marks in subjects
+    ]
+
+
+def lastpage(subjects):
+    """
+    Lines with quarter and year marks by subject.
+    """
+    return [
+        code(
+            subject.subject
+            + ": "
+            + "".join(
+                ("-" if mark is None else mark) + " " for mark in subject.quarters
+            )
+            + "| "
+            + ("-" if subject.year is None else subject.year)
+        )
+        + "\n"
+        for subject in subjects
+    ]
+
+
+def _cut(line):
+    """
+    Parts of too long line: its own lines, line longer than limit is cut,
+    as entities are kept shorter, it can be only plain text.
+    """
+    for piece in line.splitlines(keepends=True):
+        for start in range(0, len(piece), LIMIT):
+            yield piece[start : start + LIMIT]
+
+
+def split(lines, header=""):
+    """
+    Join lines into messages, not longer, than Telegram allows.
+    Lines are moved to the next message whole, only too long line is split
+    between its own lines, like links to attachments of lesson.
+    """
+    messages = []
+    parts = [header]
+    size = len(header)
+    empty = True
+    for line in lines:
+        if size + len(line) <= LIMIT or (len(line) <= LIMIT and not empty):
+            pieces = [line]
+        else:
+            pieces = _cut(line)
+        for piece in pieces:
+            if size + len(piece) > LIMIT:
+                messages.append("".join(parts))
+                parts = []
+                size = 0
+            parts.append(piece)
+            size += len(piece)
+            empty = False
+    messages.append("".join(parts))
+    return messages
@@ -0,0 +1,325 @@
+"""
+Storing users' data.
+Copyright (C) 2021  Vadim Vergasov aka VadVergasov
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import MutableMapping
+
+import ujson
+
+
+class Storage:
+    """
+    Users' and chats' data in SQLite database, every one in own row.
+    Daybook pages, snapshots and broadcasts are kept in other database,
+    so their writes don't change version of users.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+
+    def _connect(self):
+        """
+        Get connection of this process, as connections can't be shared after fork.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._connection = sqlite3.connect(
+                self._path, check_same_thread=False, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("PRAGMA busy_timeout=5000")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS users "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots (pupil_id TEXT NOT NULL, "
+                "week TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (pupil_id, week))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages (pupil_id TEXT NOT NULL, "
+                "page TEXT NOT NULL, fetched REAL NOT NULL, data BLOB NOT NULL, "
+                "PRIMARY KEY (pupil_id, page))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS broadcasts (id INTEGER PRIMARY KEY, "
+                "admin_chat INTEGER NOT NULL, text TEXT NOT NULL, chats TEXT NOT NULL, "
+                "position INTEGER NOT NULL DEFAULT 0, "
+                "delivered INTEGER NOT NULL DEFAULT 0, "
+                "failed INTEGER NOT NULL DEFAULT 0, "
+                "owner TEXT, lease REAL, done INTEGER NOT NULL DEFAULT 0)"
+            )
+        return self._connection
+
+    def version(self):
+        """
+        Get number, which changes, when database is changed by other process.
+        """
+        with self._lock:
+            return self._connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def get(self, key):
+        """
+        Get data of one user, None if there is no such user.
+        """
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT data FROM users WHERE id = ?", (key,))
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return ujson.loads(row[0])
+
+    def keys(self):
+        """
+        Get ids of all users.
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT id FROM users").fetchall()
+        return [row[0] for row in rows]
+
+    def save(self, key, data):
+        """
+        Save data of one user.
+        """
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)",
+                (key, ujson.dumps(data, ensure_ascii=False)),
+            )
+
+    def delete(self, key):
+        """
+        Remove user.
+        """
+        with self._lock:
+            self._connect().execute("DELETE FROM users WHERE id = ?", (key,))
+
+    def get_snapshot(self, pupil_id, week):
+        """
+        Get last seen state of pupil's week with undelivered changes,
+        None if it wasn't seen.
+        """
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT data FROM snapshots WHERE pupil_id = ? AND week = ?",
+                    (str(pupil_id), week),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return ujson.loads(row[0])
+
+    def save_snapshot(self, pupil_id, week, data):
+        """
+        Save state of pupil's week.
+        """
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO snapshots (pupil_id, week, data) "
+                "VALUES (?, ?, ?)",
+                (str(pupil_id), week, ujson.dumps(data, ensure_ascii=False)),
+            )
+
+    def delete_snapshots(self, week):
+        """
+        Remove states of weeks before given one.
+        """
+        with self._lock:
+            self._connect().execute("DELETE FROM snapshots WHERE week < ?", (week,))
+
+    def get_page(self, pupil_id, page):
+        """
+        Get time, when daybook page of pupil was fetched, and its data.
+        None if page wasn't saved.
+        """
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT fetched, data FROM pages WHERE pupil_id = ? AND page = ?",
+                    (str(pupil_id), page),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return row[0], ujson.loads(zlib.decompress(row[1]))
+
+    def save_page(self, pupil_id, page, data):
+        """
+        Save compressed daybook page of pupil.
+        """
+        compressed = zlib.compress(
+            ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+        )
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO pages (pupil_id, page, fetched, data) "
+                "VALUES (?, ?, ?, ?)",
+                (str(pupil_id), page, time.time(), compressed),
+            )
+
+    def add_broadcast(self, admin_chat, text, chats):
+        """
+        Save new broadcast to chats.
+        """
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO broadcasts (admin_chat, text, chats) VALUES (?, ?, ?)",
+                (admin_chat, text, ujson.dumps(chats)),
+            )
+
+    def claim_broadcast(self, owner, lease):
+        """
+        Take unfinished broadcast, which isn't processed by anyone else until lease.
+        Returns dict with broadcast or None, if there is nothing to send.
+        """
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "UPDATE broadcasts SET owner = ?, lease = ? WHERE id = "
+                "(SELECT id FROM broadcasts WHERE done = 0 AND "
+                "(owner IS NULL OR lease < ?) ORDER BY id LIMIT 1)",
+                (owner, lease, time.time()),
+            )
+            row = connection.execute(
+                "SELECT id, admin_chat, text, chats, position, delivered, failed "
+                "FROM broadcasts WHERE owner = ? AND done = 0 ORDER BY id LIMIT 1",
+                (owner,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "admin_chat": row[1],
+            "text": row[2],
+            "chats": ujson.loads(row[3]),
+            "position": row[4],
+            "delivered": row[5],
+            "failed": row[6],
+        }
+
+    def update_broadcast(self, broadcast, owner, lease, done=False):
+        """
+        Save progress of broadcast, extending lease.
+        Returns False, if broadcast was taken by someone else.
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE broadcasts SET position = ?, delivered = ?, failed = ?, "
+                "lease = ?, done = ? WHERE id = ? AND owner = ?",
+                (
+                    broadcast["position"],
+                    broadcast["delivered"],
+                    broadcast["failed"],
+                    lease,
+                    int(done),
+                    broadcast["id"],
+                    owner,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def migrate(self, path):
+        """
+        Move users from old JSON database, renaming it to not migrate it again.
+        """
+        if not os.path.isfile(path):
+            return
+        logging.info("Migrating users from %s", path)
+        with open(path, "r", encoding="utf-8") as fl_stream:
+            users = ujson.load(fl_stream)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(
+                    "INSERT OR IGNORE INTO users (id, data) VALUES (?, ?)",
+                    [
+                        (key, ujson.dumps(data, ensure_ascii=False))
+                        for key, data in users.items()
+                    ],
+                )
+        os.replace(path, path + ".bak")
+
+
+class Users(MutableMapping):
+    """
+    Dict-like view of users in storage, shared between worker processes.
+    Values are read through local copy, which is dropped,
+    when database is changed by other process, and written directly to storage.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.Lock()
+        self._version = None
+        self._users = {}
+
+    def _sync(self):
+        """
+        Drop local copy, if database was changed by someone else.
+        """
+        version = self._storage.version()
+        if version != self._version:
+            self._version = version
+            self._users = {}
+
+    def __getitem__(self, key):
+        with self._lock:
+            self._sync()
+            if key not in self._users:
+                data = self._storage.get(key)
+                if data is None:
+                    raise KeyError(key)
+                self._users[key] = data
+            return self._users[key]
+
+    def __setitem__(self, key, data):
+        with self._lock:
+            self._storage.save(key, data)
+            self._sync()
+            self._users[key] = data
+
+    def __delitem__(self, key):
+        with self._lock:
+            if self._storage.get(key) is None:
+                raise KeyError(key)
+            self._storage.delete(key)
+            self._sync()
+            self._users.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._storage.keys())
+
+    def __len__(self):
+        return len(self._storage.keys())